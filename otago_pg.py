@@ -3,682 +3,3102 @@ from typing import Dict, Any, Optional, List
 from bs4 import BeautifulSoup
 import re
 import json
+import math
+from html import escape as html_escape
+from email.utils import parsedate_to_datetime
 import time
+import threading
+import hashlib
+import sqlite3
+import gzip
+import zlib
+import os
+import atexit
+import socket
+import argparse
+import asyncio
+import multiprocessing
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from lxml import etree
+from DrissionPage import Chromium, ChromiumOptions
 from core.base_spider import BaseSpider, MixTab, ScrapeResult
 from utils.drission_scraper.drission_scraper import DrissionScraperSession
 
 import requests
+from urllib.parse import urljoin
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+from urllib3.util.retry import Retry
 
-class UniversityOfOtagoPgSpider(BaseSpider):
-    school_name = 'University_of_Otago'
-    major_level = 'pg'
+try:
+    import psutil
+except ImportError:  # 可选依赖：没有 psutil 时不按内存回收
+    psutil = None
 
-    def __init__(self):
-        super().__init__(self.school_name, self.major_level, max_workers=10)
-        # 用于存储爬取过程中的专业数据
-        self.crawled_majors = []
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
 
-    def initialize(self):
 
-        print("====== 初始化开始 ======")
+# ==============================
+# 选择器注册表：每个字段声明有序的兜底链，导入时用 lxml 预编译校验，
+# 运行时在本地快照上求值并统计各选择器命中率
+# ==============================
+LOWERED_TEXT = 'translate(.,"ABCDEFGHIJKLMNOPQRSTUVWXYZ","abcdefghijklmnopqrstuvwxyz")'
 
-        # ------- 统一默认值，防止异常中断 -------
-   
-        self.application_start_date = ""
-        self.application_deadline = ""
-        self.start_date = ""
-        self.IELTS = ""
-        self.TOEFL = ""
-        self.PTE = ""
 
-        browser = self._get_browser()
+class SelectorRegistry:
+    def __init__(self):
+        self._chains: Dict[str, List[str]] = {}
+        self._adaptive: Dict[str, bool] = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.hits: Dict[str, List[int]] = {}
+        self.lookups: Dict[str, int] = {}
+
+    def register(self, name: str, *chain: str, adaptive: bool = True):
+        # 写错的表达式在这里直接抛 XPathSyntaxError，不用等到某个页面才发现
+        for xpath in chain:
+            etree.XPath(xpath)
+        self._chains[name] = list(chain)
+        self._adaptive[name] = adaptive
+        self.hits[name] = [0] * len(chain)
+        self.lookups[name] = 0
+
+    def _compiled(self, name: str) -> List[Any]:
+        # 编译好的 XPath 对象不跨线程共享，每个线程各编译一份
+        cache = getattr(self._local, "compiled", None)
+        if cache is None:
+            cache = self._local.compiled = {}
+        if name not in cache:
+            cache[name] = [etree.XPath(xpath) for xpath in self._chains[name]]
+        return cache[name]
+
+    def _order(self, name: str) -> List[int]:
+        # adaptive 链按命中次数排序：同一版式的页面直接从有效的选择器开始
+        indexes = list(range(len(self._chains[name])))
+        if self._adaptive[name]:
+            hits = self.hits[name]
+            indexes.sort(key=lambda i: -hits[i])
+        return indexes
+
+    def find_all(self, name: str, node, **variables) -> List[Any]:
+        compiled = self._compiled(name)
+        found: List[Any] = []
+        hit = None
+        for i in self._order(name):
+            found = compiled[i](node, **variables)
+            if found:
+                hit = i
+                break
+        with self._lock:
+            self.lookups[name] += 1
+            if hit is not None:
+                self.hits[name][hit] += 1
+        return found
+
+    def find(self, name: str, node, **variables):
+        found = self.find_all(name, node, **variables)
+        return found[0] if found else None
+
+    def xpath(self, name: str, **variables: str) -> str:
+        # 给浏览器端（DrissionPage 定位符）用：取链上第一个表达式，$变量替换成字符串字面量
+        xpath = self._chains[name][0]
+        for key, value in variables.items():
+            literal = f'"{value}"' if '"' not in value else f"'{value}'"
+            xpath = re.sub(rf"\${key}\b", lambda _: literal, xpath)
+        return xpath
+
+    def report_lines(self) -> List[str]:
+        lines = []
+        for name, chain in self._chains.items():
+            lookups = self.lookups[name]
+            if not lookups:
+                continue
+            for xpath, hits in zip(chain, self.hits[name]):
+                flag = "（未命中）" if not hits else ""
+                lines.append(f"{name}: {hits}/{lookups} ({hits / lookups:.0%}){flag} {xpath}")
+        return lines
+
+
+SELECTORS = SelectorRegistry()
+# 详情页
+SELECTORS.register(
+    "banner_title",
+    "//h1[@class='page-banner__title']",
+    '//h1[contains(concat(" ", normalize-space(@class), " "), " page-banner__title ")]',
+)
+SELECTORS.register("banner_major_title", "//h3[@data-role='banner-major-title']")
+SELECTORS.register(
+    "admission_requirements", '//h3[contains(text(), "Admission to the Programme")]/following-sibling::ol[1]'
+)
+SELECTORS.register("structure_list", '//h3[contains(., "Structure of the Programme")]/following-sibling::ol[1]')
+SELECTORS.register("structure_heading", '//h3[contains(., "Structure of the Programme")]')
+SELECTORS.register("programme_structure", '//div[@id="programme-structure"]')
+# 两个表达式可能命中不同的 <h2>，保持声明顺序
+SELECTORS.register(
+    "overview_heading",
+    '//h2[@id="overview"]',
+    f'//h2[contains({LOWERED_TEXT},"overview")]',
+    adaptive=False,
+)
+SELECTORS.register("expected_duration", '//dt[contains(.,"Duration")]/following-sibling::dd/span')
+SELECTORS.register(
+    "language_heading",
+    f'//h2[contains({LOWERED_TEXT},"english language requirements")]'
+    f' | //h3[contains({LOWERED_TEXT},"english language requirements")]'
+    f' | //h4[contains({LOWERED_TEXT},"english language requirements")]',
+)
+# 学费：四种版式各自的后处理不同，分别注册；$year 为目标学费年份
+SELECTORS.register("fees_info_bar", '//span[contains(., concat("International fee ", $year, ":"))]')
+SELECTORS.register(
+    "fees_details_item",
+    '//div[@class="programme-details__fees-item" and contains(., concat("International ", $year))]',
+)
+SELECTORS.register(
+    "fees_nzd_text", '//*[contains(text(), "NZ$") and (contains(text(), "International") or contains(text(), $year))]'
+)
+SELECTORS.register(
+    "fees_details_heading",
+    '//div[contains(@class,"programme-details__fees-item")]//p[contains(., concat("International ", $year))]'
+    '/following-sibling::h3[1]',
+)
+# 课程子页面
+SELECTORS.register(
+    "course_title",
+    '//h1[contains(concat(" ", normalize-space(@class), " "), " page-banner__title ")]',
+)
+# 申请日期页 / 语言要求页
+SELECTORS.register("key_dates_start", '//*[@id="table62309r1c1"]')
+SELECTORS.register("key_dates_deadline", '//*[@id="table62309r6c1"]')
+SELECTORS.register("key_dates_deadline_extra", '//*[@id="table29326r3c1"]')
+SELECTORS.register("key_dates_semester", '//p[contains(.,"semester")]')
+SELECTORS.register("language_score", '//td[contains(.,$test)]/following-sibling::td[2]')
+# 申请弹窗：只在浏览器里求值（SELECTORS.xpath 转成定位符）
+SELECTORS.register("start_application", '//button[contains(.,"Start application")]')
+SELECTORS.register("continue_application", '//a[contains(.,"Continue application")]')
+SELECTORS.register(
+    "campus_options", '//h4[text()="Christchurch" or text()="Dunedin" or text()="Wellington"]'
+)
+SELECTORS.register("campus_option", '//h4[text()=$campus]')
+
+
+# ==============================
+# 课程名称缓存（按课程页 URL，跨 worker 共享，落盘保存）
+# ==============================
+class CourseTitleCache:
+    def __init__(self, path: Path, ttl: float, max_entries: int, save_every: int = 50):
+        self.path = Path(path)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.save_every = save_every
+        self.hits = 0
+        self.misses = 0
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._pending: Dict[str, threading.Event] = {}
+        self._unsaved = 0
+        self._lock = threading.Lock()
+        # 保存（读盘合并 + 写临时文件 + 改名）同一时间只允许一个线程做
+        self._save_lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        now = time.time()
+        for url, entry in data.get("entries", {}).items():
+            if now - entry.get("ts", 0) < self.ttl and entry.get("title"):
+                self._entries[url] = entry
+
+    def _lookup(self, url: str) -> Optional[str]:
+        entry = self._entries.get(url)
+        if not entry:
+            return None
+        if time.time() - entry["ts"] >= self.ttl:
+            # 过期，下次重新抓
+            del self._entries[url]
+            return None
+        entry["atime"] = time.time()
+        return entry["title"]
+
+    def _store(self, url: str, code: str, title: str):
+        now = time.time()
+        self._entries[url] = {"code": code, "title": title, "ts": now, "atime": now}
+        # 超出容量时按最近访问时间淘汰
+        if len(self._entries) > self.max_entries:
+            overflow = len(self._entries) - self.max_entries
+            oldest = sorted(self._entries.items(), key=lambda kv: kv[1].get("atime", kv[1]["ts"]))
+            for old_url, _ in oldest[:overflow]:
+                del self._entries[old_url]
+        self._unsaved += 1
+
+    def get_or_load(self, url: str, code: str, loader) -> str:
+        # 同一个 URL 同一时间只允许一个 worker 去抓，其余等待结果
+        with self._lock:
+            title = self._lookup(url)
+            if title is not None:
+                self.hits += 1
+                return title
+            event = self._pending.get(url)
+            owner = event is None
+            if owner:
+                event = threading.Event()
+                self._pending[url] = event
+
+        if not owner:
+            event.wait(60)
+            with self._lock:
+                title = self._lookup(url)
+                if title is not None:
+                    self.hits += 1
+                    return title
+                self.misses += 1
+            return loader(url)
+
+        title = ""
+        try:
+            title = loader(url)
+        finally:
+            with self._lock:
+                self.misses += 1
+                if title:
+                    self._store(url, code, title)
+                self._pending.pop(url, None)
+                need_save = self._unsaved >= self.save_every
+                if need_save:
+                    # 在同一个临界区里清零，其他线程不会再同时触发保存
+                    self._unsaved = 0
+            event.set()
+            if need_save:
+                self.save()
+        return title
+
+    def save(self):
+        with self._save_lock:
+            self._save()
+
+    def _save(self):
+        with self._lock:
+            entries = dict(self._entries)
+            self._unsaved = 0
+        # 多个进程共用同一个缓存文件：先合并磁盘上其他进程写入的条目，同一 URL 取较新的
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                on_disk = json.load(f).get("entries", {})
+        except (OSError, ValueError):
+            on_disk = {}
+        now = time.time()
+        for url, entry in on_disk.items():
+            if now - entry.get("ts", 0) < self.ttl and entry.get("ts", 0) > entries.get(url, {}).get("ts", 0):
+                entries[url] = entry
+        if len(entries) > self.max_entries:
+            newest = sorted(entries.items(), key=lambda kv: kv[1].get("atime", kv[1]["ts"]), reverse=True)
+            entries = dict(newest[:self.max_entries])
+        data = {"saved_at": now, "entries": entries}
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            tmp_path.replace(self.path)
+        except OSError as e:
+            print(f"课程名称缓存保存失败: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+                "entries": len(self._entries),
+            }
 
 
+# ==============================
+# 共用的 HTTP 会话（keep-alive 连接池 + 重试）
+# ==============================
+HTTP_USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/124.0 Safari/537.36"
+)
+
+
+def build_http_session(pool_size: int, cache: Optional["HttpResponseCache"] = None) -> requests.Session:
+    # pool_block=True：每个主机最多 pool_size 个连接，连接用满时请求排队等待，
+    # 不会像默认那样临时多开连接，保证静态抓取也不超过礼貌并发上限（命中本地缓存的请求不占连接）
+    session = requests.Session()
+    session.headers.update({"User-Agent": HTTP_USER_AGENT})
+    adapter_kwargs = dict(
+        pool_connections=4,
+        pool_maxsize=pool_size,
+        pool_block=True,
+        max_retries=Retry(total=2, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504]),
+    )
+    if cache is not None and cache.mode != "off":
+        adapter = CachingHTTPAdapter(cache, **adapter_kwargs)
+    else:
+        adapter = HTTPAdapter(**adapter_kwargs)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+# ==============================
+# 本地 HTTP 响应缓存：响应体按 sha256 内容寻址存盘，SQLite 记录 URL 索引和有效期
+# ==============================
+class HttpResponseCache:
+    def __init__(self, root: Path, mode: str = "normal", default_ttl: float = 6 * 3600,
+                 ttl_override: Optional[float] = None, max_bytes: int = 2 * 1024 ** 3,
+                 max_age: float = 30 * 24 * 3600, evict_every: int = 200):
+        # mode: normal=按响应缓存头（没有时用 default_ttl），offline=只从缓存读取，off=不缓存
+        # ttl_override: 设置后忽略响应缓存头，统一使用这个有效期
+        self.root = Path(root)
+        self.blob_dir = self.root / 'blobs'
+        self.mode = mode
+        self.default_ttl = default_ttl
+        self.ttl_override = ttl_override
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.evict_every = evict_every
+        self._stores_since_evict = 0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "revalidated": 0, "stored": 0, "evicted": 0}
+
+        self.blob_dir.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.root / 'index.sqlite3'), timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                url TEXT PRIMARY KEY,
+                status INTEGER,
+                headers TEXT,
+                content_hash TEXT,
+                size INTEGER,
+                stored_at REAL,
+                expires_at REAL,
+                last_used REAL
+            )
+            """
+        )
+        self._conn.commit()
+
+    @property
+    def offline(self) -> bool:
+        return self.mode == "offline"
+
+    def _blob_path(self, content_hash: str) -> Path:
+        return self.blob_dir / content_hash[:2] / content_hash
+
+    def freshness(self, headers) -> Optional[float]:
+        # 返回有效期（秒）；None 表示不能缓存
+        if self.ttl_override is not None:
+            return self.ttl_override
+        cache_control = headers.get("Cache-Control", "").lower()
+        if "no-store" in cache_control:
+            return None
+        if "no-cache" in cache_control:
+            return 0.0
+        match = re.search(r"max-age=(\d+)", cache_control)
+        if match:
+            return float(match.group(1))
+        expires = headers.get("Expires")
+        if expires:
+            try:
+                return max(0.0, parsedate_to_datetime(expires).timestamp() - time.time())
+            except (TypeError, ValueError):
+                return 0.0
+        return self.default_ttl
+
+    def get(self, url: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT status, headers, content_hash, expires_at FROM responses WHERE url = ?", (url,)
+            ).fetchone()
+        if not row:
+            return None
+        try:
+            content = self._blob_path(row[2]).read_bytes()
+        except OSError:
+            return None
+        return {
+            "status": row[0],
+            "headers": json.loads(row[1]),
+            "content": content,
+            "fresh": time.time() < row[3],
+        }
 
-        # =====================================================================
-        # 2）申请日期
-        # =====================================================================
-        print(" 获取申请日期...")
+    def put(self, url: str, status: int, headers: Dict[str, str], content: bytes) -> bool:
+        ttl = self.freshness(headers)
+        if ttl is None:
+            return False
+        content_hash = hashlib.sha256(content).hexdigest()
+        blob = self._blob_path(content_hash)
+        if not blob.exists():
+            # 相同内容只存一份；先写临时文件再改名，多进程同时写也不会读到半个文件
+            blob.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = blob.with_name(f"{content_hash}.{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp_path.write_bytes(content)
+            tmp_path.replace(blob)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (url, status, headers, content_hash, size, stored_at, expires_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (url, status, json.dumps(dict(headers)), content_hash, len(content), now, now + ttl, now),
+            )
+            self._conn.commit()
+            self.stats["stored"] += 1
+            self._stores_since_evict += 1
+            evict = self._stores_since_evict >= self.evict_every
+        if evict:
+            self.evict()
+        return True
+
+    def refresh(self, url: str, headers: Dict[str, str]):
+        # 304 重新验证成功：延长有效期，内容不变
+        ttl = self.freshness(headers)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE responses SET expires_at = ?, last_used = ? WHERE url = ?",
+                (now + (ttl or 0.0), now, url),
+            )
+            self._conn.commit()
+
+    def touch(self, url: str):
+        with self._lock:
+            self._conn.execute("UPDATE responses SET last_used = ? WHERE url = ?", (time.time(), url))
+            self._conn.commit()
+
+    def count(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
+
+    def evict(self):
+        # 先删超过 max_age 的条目，再按最近使用时间从旧到新删，直到总大小不超过 max_bytes
+        with self._lock:
+            self._stores_since_evict = 0
+            removed = [
+                row[0]
+                for row in self._conn.execute(
+                    "SELECT content_hash FROM responses WHERE stored_at < ?", (time.time() - self.max_age,)
+                )
+            ]
+            self._conn.execute("DELETE FROM responses WHERE stored_at < ?", (time.time() - self.max_age,))
+            total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total > self.max_bytes:
+                for url, content_hash, size in self._conn.execute(
+                    "SELECT url, content_hash, size FROM responses ORDER BY last_used"
+                ).fetchall():
+                    if total <= self.max_bytes:
+                        break
+                    self._conn.execute("DELETE FROM responses WHERE url = ?", (url,))
+                    removed.append(content_hash)
+                    total -= size
+            self._conn.commit()
+            # 没有其他 URL 引用的内容才删除文件
+            orphaned = [
+                h for h in set(removed)
+                if not self._conn.execute("SELECT 1 FROM responses WHERE content_hash = ? LIMIT 1", (h,)).fetchone()
+            ]
+            self.stats["evicted"] += len(removed)
+        for content_hash in orphaned:
+            try:
+                self._blob_path(content_hash).unlink()
+            except OSError:
+                pass
 
+    def close(self):
+        if not self.offline:
+            self.evict()
+        with self._lock:
+            self._conn.close()
+
+
+class CachingHTTPAdapter(HTTPAdapter):
+    CONDITIONAL_HEADERS = ("If-None-Match", "If-Modified-Since")
+
+    def __init__(self, cache: HttpResponseCache, **kwargs):
+        self.cache = cache
+        super().__init__(**kwargs)
+
+    def _cached_response(self, request, entry: Dict[str, Any]) -> requests.Response:
+        resp = requests.Response()
+        resp.status_code = entry["status"]
+        resp.headers = CaseInsensitiveDict(entry["headers"])
+        resp.headers["X-Local-Cache"] = "hit"
+        resp._content = entry["content"]
+        resp.encoding = get_encoding_from_headers(resp.headers)
+        resp.url = request.url
+        resp.reason = "OK"
+        resp.request = request
+        resp.connection = self
+        return resp
+
+    def send(self, request, **kwargs):
+        if request.method != "GET":
+            return super().send(request, **kwargs)
+
+        # 增量检查自带的条件请求要看服务器的真实回复（304），不直接用缓存；离线模式除外
+        conditional = any(h in request.headers for h in self.CONDITIONAL_HEADERS)
+        entry = self.cache.get(request.url)
+        if entry and (self.cache.offline or (entry["fresh"] and not conditional)):
+            self.cache.count("hits")
+            self.cache.touch(request.url)
+            return self._cached_response(request, entry)
+        if self.cache.offline:
+            self.cache.count("misses")
+            raise requests.ConnectionError(f"离线模式，缓存中没有 {request.url}", request=request)
+
+        # 缓存过期但有 ETag / Last-Modified 时，带条件头重新验证
+        revalidating = False
+        if entry and not conditional:
+            if entry["headers"].get("ETag"):
+                request.headers["If-None-Match"] = entry["headers"]["ETag"]
+                revalidating = True
+            if entry["headers"].get("Last-Modified"):
+                request.headers["If-Modified-Since"] = entry["headers"]["Last-Modified"]
+                revalidating = True
+
+        resp = super().send(request, **kwargs)
+        if revalidating and resp.status_code == 304:
+            resp.close()
+            self.cache.count("revalidated")
+            self.cache.refresh(request.url, resp.headers)
+            return self._cached_response(request, entry)
+
+        self.cache.count("misses")
+        if resp.status_code == 200:
+            self.cache.put(request.url, resp.status_code, resp.headers, resp.content)
+        return resp
+
+
+# ==============================
+# 课程子页面 HTTP 抓取（连接池 + 并发上限，无需浏览器）
+# ==============================
+class CourseTitleFetcher:
+    def __init__(self, session: requests.Session, max_concurrency: int = 8, timeout: float = 15, browser_fallback=None):
+        self.session = session
+        self.timeout = timeout
+        self.browser_fallback = browser_fallback
+        self.http_titles = 0
+        self.browser_titles = 0
+        # 所有 worker 共用一个线程池，整体并发不超过 max_concurrency
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="course-title")
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def parse_title(html) -> str:
+        if not html:
+            return ""
+        tree = etree.HTML(html)
+        if tree is None:
+            return ""
+        h1 = SELECTORS.find("course_title", tree)
+        return " ".join(h1.xpath("string()").split()) if h1 is not None else ""
+
+    def fetch_title(self, url: str) -> str:
         try:
-            tab = browser.new_tab()
-            tab.get("https://www.otago.ac.nz/international/future-students/prepare-for-otago/key-dates-for-new-international-students", timeout=40)
-            tab.wait.doc_loaded()
+            resp = self.session.get(url, timeout=self.timeout)
+            resp.raise_for_status()
+            title = self.parse_title(resp.content)
+        except Exception as e:
+            print(f"课程页 HTTP 抓取失败 {url}: {e}")
+            title = ""
 
-            # 开始时间
-            try:
-                self.application_start_date = tab.ele('css:#table62309r1c1').text
-            except:
-                self.application_start_date = ""
+        if title:
+            with self._lock:
+                self.http_titles += 1
+            return title
 
-            # 截止日期
+        # HTTP 响应里没有标题时才回退浏览器
+        if self.browser_fallback:
+            title = self.browser_fallback(url)
+            if title:
+                with self._lock:
+                    self.browser_titles += 1
+        return title
+
+    def resolve(self, links: List[Dict[str, str]], cache: "CourseTitleCache") -> Dict[str, str]:
+        # 返回 {href: 课程名称}，同一页面内重复链接只查一次
+        futures = {}
+        for item in links:
+            href = item.get("href")
+            if href and href not in futures:
+                futures[href] = self._executor.submit(cache.get_or_load, href, item.get("text", ""), self.fetch_title)
+
+        titles = {}
+        for href, future in futures.items():
             try:
-                d1 = tab.ele('css:#table62309r6c1').text
-                d2 = tab.ele('css:#table29326r3c1').text
-                self.application_deadline = f"{d1}  {d2}"
-            except:
-                self.application_deadline = ""
+                titles[href] = future.result()
+            except Exception:
+                titles[href] = ""
+        return titles
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+
+# ==============================
+# 详情页快照：page.html 只取一次，所有字段在本地 lxml 树上解析
+# ==============================
+def outer_html(ele) -> str:
+    return etree.tostring(ele, encoding="unicode", method="html", with_tail=False).strip()
+
+
+def element_text(ele) -> str:
+    return " ".join(ele.xpath("string()").split())
+
+
+def next_element(ele):
+    # 跳过注释等非元素节点，与浏览器的 next() 保持一致
+    sib = ele.getnext()
+    while sib is not None and not isinstance(sib.tag, str):
+        sib = sib.getnext()
+    return sib
+
+
+YEAR_HEADING_TAGS = ("h2", "h3", "h4")
+YEAR_PATTERN = re.compile(r"\b(20\d\d)\b")
+
+
+def heading_year(ele) -> Optional[int]:
+    if ele.tag not in YEAR_HEADING_TAGS:
+        return None
+    match = YEAR_PATTERN.search(ele.xpath("string()"))
+    return int(match.group(1)) if match else None
+
+
+def filter_year_sections(container, keep_year: int) -> str:
+    # 课程结构按年份分段（<h3>2025 ...</h3> ... <h3>2026 ...</h3> ...），只保留 keep_year 那一段；
+    # 年份标题之前的通用内容保留。页面上没有目标年份时不做过滤。
+    # 只有和第一个年份标题同级的标题才是分段标题：带年份的开始新的一段，不带年份的（例如 Notes）结束上一段；
+    # 其他级别的标题（例如段内的 "Students who started in 2024"）属于所在的段落
+    year_text = str(keep_year)
+    first_heading = next(
+        (h for h in container.iter(*YEAR_HEADING_TAGS) if heading_year(h) is not None), None
+    )
+    section_tag = first_heading.tag if first_heading is not None else None
+    has_target = section_tag is not None and any(
+        year_text in h.xpath("string()") for h in container.iter(section_tag)
+    )
+
+    def open_tag(ele) -> str:
+        shell = etree.Element(ele.tag, attrib=dict(ele.attrib))
+        serialized = etree.tostring(shell, encoding="unicode", method="html")
+        return serialized[:serialized.rfind("</")]
+
+    def render(ele) -> str:
+        parts = [open_tag(ele), html_escape(ele.text or "", quote=False)]
+        current_year = None
+        for child in ele:
+            if not isinstance(child.tag, str):
+                # 注释等节点直接丢弃，只保留尾随文本
+                if current_year in (None, keep_year):
+                    parts.append(html_escape(child.tail or "", quote=False))
+                continue
+            is_section_heading = has_target and child.tag == section_tag
+            if is_section_heading:
+                current_year = heading_year(child)
+            if current_year not in (None, keep_year):
+                continue
+            if has_target and not is_section_heading and any(heading_year(h) for h in child.iter(section_tag)):
+                # 年份标题嵌在子容器里，递归处理这一层
+                parts.append(render(child) + html_escape(child.tail or "", quote=False))
+            else:
+                parts.append(etree.tostring(child, encoding="unicode", method="html", with_tail=True))
+        parts.append(f"</{ele.tag}>")
+        return "".join(parts)
+
+    return render(container).strip()
+
+
+def extract_course_links(fragment_html: str, base_url: str = "") -> List[Dict[str, str]]:
+    # 课程链接优先取 data-uw-original-href（无障碍插件改写前的原链接），转成绝对地址；
+    # 重复出现的课程全部保留（与页面上的顺序一致），去重只在查课程名称时做（CourseTitleFetcher.resolve）
+    fragment = etree.HTML(fragment_html) if fragment_html else None
+    if fragment is None:
+        return []
+    links = []
+    for a in fragment.iter("a"):
+        text = " ".join(a.xpath("string()").split())
+        href = a.get("data-uw-original-href") or a.get("href") or ""
+        href = urljoin(base_url, href.strip()) if href.strip() else ""
+        links.append({"text": text, "href": href})
+    return links
+
+
+FEE_AMOUNT_PATTERN = re.compile(r'(NZ\$|NZD|AU\$|US\$|\$)\s*(\d[\d,]*(?:\.\d+)?)', re.I)
+FEE_TOTAL_KEYWORDS = ("total", "full programme", "whole programme", "per programme")
+
+
+def parse_fee_text(text: str, year: int) -> Dict[str, Any]:
+    # 把学费文本拆成结构化字段：金额、币种、年份、按年/总价、是否待定
+    info: Dict[str, Any] = {
+        "text": text,
+        "amount": None,
+        "currency": "",
+        "year": year,
+        "period": "",
+        "tbc": "to be confirmed" in (text or "").lower(),
+    }
+    if not text:
+        return info
+    match = FEE_AMOUNT_PATTERN.search(text)
+    if match:
+        symbol = match.group(1).upper()
+        info["currency"] = {"NZ$": "NZD", "$": "NZD", "AU$": "AUD", "US$": "USD"}.get(symbol, symbol)
+        info["amount"] = float(match.group(2).replace(",", ""))
+        lowered = text.lower()
+        info["period"] = "total" if any(k in lowered for k in FEE_TOTAL_KEYWORDS) else "annual"
+    year_match = YEAR_PATTERN.search(text)
+    if year_match:
+        info["year"] = int(year_match.group(0))
+    return info
+
+
+class DetailPageSnapshot:
+    FACULTY_DIVISIONS = [
+        "Division of Health Sciences",
+        "Division of Humanities",
+        "Division of Sciences",
+        "Otago Business School",
+    ]
+
+    def __init__(self, html: str, url: str = ""):
+        self.url = url
+        self.html = html or ""
+        self.tree = etree.HTML(self.html) if self.html else None
+        if self.tree is None:
+            raise ValueError("页面 HTML 为空")
+        self._html_lower = None
+
+    @property
+    def html_lower(self) -> str:
+        if self._html_lower is None:
+            self._html_lower = self.html.lower()
+        return self._html_lower
+
+    def first(self, selector: str):
+        return SELECTORS.find(selector, self.tree)
+
+    def following_paragraphs(self, title) -> str:
+        # 从标题的下一个兄弟节点开始，连续收集 <p>，遇到非 p 停止
+        parts = []
+        sib = next_element(title)
+        while sib is not None and sib.tag == "p":
+            parts.append(outer_html(sib))
+            sib = next_element(sib)
+        return "\n".join(parts)
+
+    # ---------- 各字段提取 ----------
+    def banner_title(self) -> str:
+        h1 = self.first("banner_title")
+        return element_text(h1) if h1 is not None else ""
+
+    def major_title(self) -> str:
+        h1_text = self.banner_title()
+        h3 = self.first("banner_major_title")
+        h3_text = element_text(h3) if h3 is not None else ""
+        return f"{h1_text} {h3_text}".strip() if h3_text else h1_text
+
+    def degree(self) -> str:
+        h1_text = self.banner_title()
+        if "(" in h1_text and ")" in h1_text:
+            return h1_text[h1_text.find("(") + 1:h1_text.rfind(")")].strip()
+        return ""
+
+    def admission_requirements(self) -> str:
+        ol = self.first("admission_requirements")
+        return outer_html(ol) if ol is not None else ""
+
+    def structure_list(self) -> str:
+        ol = self.first("structure_list")
+        if ol is not None:
+            return outer_html(ol)
+        # 没有 <ol> 时，取标题后连续的 <p>
+        h3 = self.first("structure_heading")
+        return self.following_paragraphs(h3) if h3 is not None else ""
+
+    def programme_structure(self):
+        return self.first("programme_structure")
+
+    def faculty(self) -> str:
+        main_html = self.html_lower.split("academic divisions")[0]
+        for d in self.FACULTY_DIVISIONS:
+            if d.lower() in main_html:
+                return d
+        return ""
+
+    def overview(self) -> str:
+        title = self.first("overview_heading")
+        return self.following_paragraphs(title) if title is not None else ""
+
+    def study_mode(self) -> str:
+        if "full-time" in self.html_lower:
+            return "full-time"
+        if "part-time" in self.html_lower:
+            return "part-time"
+        return ""
+
+    def expected_duration(self) -> str:
+        span = self.first("expected_duration")
+        return element_text(span) if span is not None else ""
+
+    def fee_info(self, year: int) -> Dict[str, Any]:
+        # 按版式优先级依次匹配；先用小写 HTML 做子串预检，页面里没有相关文字时跳过对应查询，
+        # 全文 NZ$ 扫描只在前两种版式都没有拿到确定学费时才执行
+        year_text = str(year)
+        fees, layout, scanned = "", "", False
+        if "international" in self.html_lower:
+            # 第一种结构（qualification-info-bar）
+            fees_span = SELECTORS.find("fees_info_bar", self.tree, year=year_text)
+            if fees_span is not None:
+                layout = "info_bar"
+                full_text = element_text(fees_span)
+                if "to be confirmed" in full_text.lower():
+                    fees = "To be confirmed"
+                else:
+                    fee_match = re.search(rf'International fee {year_text}:\s*([^<]+)', full_text)
+                    if fee_match:
+                        fee_text = fee_match.group(1).strip()
+                        # 如果是数字格式，添加annual
+                        fees = f"{fee_text} annual" if re.search(r'\d', fee_text) else fee_text
+                    else:
+                        fees = full_text
+            else:
+                # 第二种结构（programme-details）
+                fees_div = SELECTORS.find("fees_details_item", self.tree, year=year_text)
+                if fees_div is not None:
+                    layout = "details_item"
+                    fees_h3 = fees_div.xpath('.//h3')
+                    if fees_h3:
+                        fees_text = element_text(fees_h3[0])
+                        if fees_text and "to be confirmed" not in fees_text.lower():
+                            fees = f"{fees_text} annual"
+                        else:
+                            fees = fees_text
+                    else:
+                        fees = element_text(fees_div).split(f"International {year_text}")[-1].strip()
+
+        if (not fees or "to be confirmed" in fees.lower()) and "nz$" in self.html_lower:
+            # 包含"NZ$"的学费信息（全文扫描，代价最高）
+            scanned = True
+            for element in SELECTORS.find_all("fees_nzd_text", self.tree, year=year_text):
+                fees_text = element_text(element)
+                if fees_text and "to be confirmed" not in fees_text.lower():
+                    fees, layout = f"{fees_text} annual", "nzd_text"
+                    break
 
-            # 开学日期
-            try:
-                texts = [e.text for e in tab.eles('x://p[contains(.,"semester")]')]
-                s1, s2 = "", ""
-                for t in texts:
-                    if "semester 1" in t.lower():
-                        s1 = t
-                    if "semester 2" in t.lower():
-                        s2 = t
-                self.start_date = f"{s1} {s2}".strip()
-            except:
-                self.start_date = ""
+        if (not fees or "to be confirmed" in fees.lower()) and "international" in self.html_lower:
+            # 最后尝试原始的路径
+            fees_ele = SELECTORS.find("fees_details_heading", self.tree, year=year_text)
+            if fees_ele is not None:
+                fees_text = element_text(fees_ele)
+                if fees_text and "to be confirmed" not in fees_text.lower():
+                    fees, layout = f"{fees_text} annual", "details_heading"
+                else:
+                    fees = fees_text
 
-            tab.close()
-            print(" 申请日期完成")
+        info = parse_fee_text(fees, year)
+        info.update({"layout": layout or "none", "fallback_scanned": scanned})
+        return info
 
-        except Exception as e:
-            print(" 申请日期失败:", e)
-            self.application_start_date = ""
-            self.application_deadline = ""
-            self.start_date = ""
-            try:
-                tab.close()
-            except:
-                pass
+    def language_require(self) -> str:
+        title = self.first("language_heading")
+        return self.following_paragraphs(title) if title is not None else ""
 
-        # =====================================================================
-        # 3）语言要求
-        # =====================================================================
-        print(" 获取语言要求...")
 
-        try:
-            tab = browser.new_tab()
-            tab.get("https://www.otago.ac.nz/future-students/entry-requirements/language-requirements", timeout=40)
-            tab.wait.doc_loaded()
-
-            # IELTS
-            try:
-                self.IELTS = tab.ele('x://td[contains(.,"IELTS")]/following-sibling::td[2]').text
-            except:
-                self.IELTS = ""
+# ==============================
+# 带版本号 / 有效期 / 内容哈希的 JSON 缓存（用于初始化数据）
+# ==============================
+class VersionedJsonCache:
+    def __init__(self, path: Path, version: int, ttl: float):
+        self.path = Path(path)
+        self.version = version
+        self.ttl = ttl
 
-            # TOEFL
-            try:
-                self.TOEFL = tab.ele('x://td[contains(.,"TOEFL")]/following-sibling::td[2]').text
-            except:
-                self.TOEFL = ""
+    @staticmethod
+    def content_hash(data: Dict[str, Any]) -> str:
+        payload = json.dumps(data, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
 
-            # PTE
-            try:
-                self.PTE = tab.ele('x://td[contains(.,"PTE")]/following-sibling::td[2]').text
-            except:
-                self.PTE = ""
+    def load(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if cached.get("version") != self.version:
+            return None
+        if time.time() - cached.get("saved_at", 0) >= self.ttl:
+            return None
+        data = cached.get("data")
+        if not isinstance(data, dict) or cached.get("hash") != self.content_hash(data):
+            print(f"缓存校验失败，忽略: {self.path}")
+            return None
+        return data
+
+    def save(self, data: Dict[str, Any]):
+        cached = {
+            "version": self.version,
+            "saved_at": time.time(),
+            "hash": self.content_hash(data),
+            "data": data,
+        }
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(cached, f, ensure_ascii=False, indent=2)
+            tmp_path.replace(self.path)
+        except OSError as e:
+            print(f"缓存保存失败 {self.path}: {e}")
+
+
+# ==============================
+# 增量抓取：按 URL 保存 ETag / Last-Modified / 内容指纹和上次结果
+# ==============================
+def page_fingerprint(html) -> str:
+    # 只对正文文本和链接取哈希，忽略脚本、样式等每次加载都会变的内容
+    tree = etree.HTML(html) if html else None
+    if tree is None:
+        return ""
+    for ele in tree.xpath("//script | //style | //noscript | //comment()"):
+        parent = ele.getparent()
+        if parent is not None:
+            parent.remove(ele)
+    roots = tree.xpath("//main") or tree.xpath("//body") or [tree]
+    parts = []
+    for root in roots:
+        parts.append(" ".join(root.xpath("string()").split()))
+        parts.extend(root.xpath(".//a/@href"))
+    return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()
+
+
+class PageStateStore:
+    def __init__(self, path: Path, extractor_version: int = 1):
+        # extractor_version 随记录一起保存；读出的版本和当前不一致时由调用方按"已变化"处理
+        self.path = Path(path)
+        self.extractor_version = extractor_version
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS page_state (
+                url TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                content_hash TEXT,
+                record TEXT,
+                scraped_at REAL,
+                extractor_version INTEGER
+            )
+            """
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(page_state)")}
+        if "extractor_version" not in columns:
+            # 旧库没有这一列：已有记录的版本为 NULL，全部视为需要重抓
+            self._conn.execute("ALTER TABLE page_state ADD COLUMN extractor_version INTEGER")
+        self._conn.commit()
+
+    def get(self, url: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT etag, last_modified, content_hash, record, scraped_at, extractor_version "
+                "FROM page_state WHERE url = ?",
+                (url,),
+            ).fetchone()
+        if not row:
+            return None
+        return {
+            "etag": row[0],
+            "last_modified": row[1],
+            "content_hash": row[2],
+            "record": json.loads(row[3]) if row[3] else None,
+            "scraped_at": row[4],
+            "extractor_version": row[5],
+        }
 
-            tab.close()
-            print("语言要求完成")
+    def put(self, url: str, validators: Dict[str, str], record: Optional[Dict[str, Any]]):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO page_state "
+                "(url, etag, last_modified, content_hash, record, scraped_at, extractor_version) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    url,
+                    validators.get("etag", ""),
+                    validators.get("last_modified", ""),
+                    validators.get("content_hash", ""),
+                    json.dumps(record, ensure_ascii=False),
+                    time.time(),
+                    self.extractor_version,
+                ),
+            )
+            self._conn.commit()
 
-        except Exception as e:
-            print("语言要求失败:", e)
-            self.IELTS = ""
-            self.TOEFL = ""
-            self.PTE = ""
-            try:
-                tab.close()
-            except:
-                pass
+    def urls(self) -> List[str]:
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT url FROM page_state")]
 
-        print("====== 初始化完成 ======")
-        print("IELTS:", self.IELTS)
-        print("TOEFL:", self.TOEFL)
-        print("PTE:", self.PTE)
-        print("Start date:", self.start_date)
+    def close(self):
+        with self._lock:
+            self._conn.close()
 
 
+def read_jsonl(path: Path):
+    # 逐行读取，不把结果整体加载进内存；最后一行写到一半时跳过
+    path = Path(path)
+    if not path.exists():
+        return
+    opener = gzip.open if path.suffix == ".gz" else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        try:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+        except (EOFError, OSError, zlib.error):
+            # gzip 尾部不完整（上次异常退出）
+            return
+
+
+# ==============================
+# 结果流式落盘：每条结果立即追加写入 JSONL（可选 gzip），支持断点续爬
+# ==============================
+class JsonlResultSink:
+    def __init__(self, path: Path, compress: bool = False, fsync: str = "interval",
+                 fsync_every: int = 20, resume: bool = True):
+        # fsync: always=每条都 fsync，interval=每 fsync_every 条一次，never=交给系统
+        self.compress = compress
+        self.path = Path(str(path) + ".gz") if compress else Path(path)
+        self.complete_marker = self.path.with_name(self.path.name + ".complete")
+        self.fsync = fsync
+        self.fsync_every = fsync_every
+        self._lock = threading.Lock()
+        self._unsynced = 0
+        self._count = 0
+        self.done_urls = set()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # 上次没跑完（没有 complete 标记）才续爬，否则重新开始
+        if resume and self.path.exists() and not self.complete_marker.exists():
+            # 先去掉上次异常退出留下的半条记录，再接着写
+            if compress:
+                self._rewrite_gzip()
+            else:
+                self._truncate_partial_line()
+            for record in self:
+                self._count += 1
+                self.done_urls.add(record.get("major_url-href", ""))
+            print(f"断点续爬: 已有 {self._count} 条结果 {self.path}")
+            mode = "at"
+        else:
+            mode = "wt"
+        if self.complete_marker.exists():
+            self.complete_marker.unlink()
+        if compress:
+            self._file = gzip.open(self.path, mode, encoding="utf-8")
+        else:
+            self._file = open(self.path, mode, encoding="utf-8")
+
+    def _truncate_partial_line(self):
+        # 截到最后一个换行符，避免新记录接在半行后面被一起丢掉
+        with open(self.path, "rb+") as f:
+            end = f.seek(0, os.SEEK_END)
+            pos = end
+            while pos > 0:
+                step = min(65536, pos)
+                f.seek(pos - step)
+                chunk = f.read(step)
+                idx = chunk.rfind(b"\n")
+                if idx >= 0:
+                    pos = pos - step + idx + 1
+                    break
+                pos -= step
+            if pos != end:
+                f.truncate(pos)
+
+    def _rewrite_gzip(self):
+        # gzip 尾部损坏时，后面追加的新 member 也读不出来；把能读出的记录写到新文件再替换
+        tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            for record in read_jsonl(self.path):
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        tmp_path.replace(self.path)
+
+    def append(self, record: Dict[str, Any]):
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._count += 1
+            self._unsynced += 1
+            if self.fsync == "always" or (self.fsync == "interval" and self._unsynced >= self.fsync_every):
+                self._sync()
+            else:
+                self._file.flush()
+
+    def _sync(self):
+        self._file.flush()
+        fileobj = getattr(self._file, "fileobj", None) or self._file
+        if hasattr(fileobj, "flush"):
+            fileobj.flush()
+        os.fsync(fileobj.fileno())
+        self._unsynced = 0
+
+    def flush(self):
+        with self._lock:
+            if not self._file.closed:
+                self._sync()
+
+    def close(self, complete: bool = False):
+        with self._lock:
+            if not self._file.closed:
+                self._sync()
+                self._file.close()
+        if complete:
+            self.complete_marker.touch()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __iter__(self):
+        return read_jsonl(self.path)
+
+
+# ==============================
+# 去重输出：长字符串按内容哈希存入 blob 表（大字段 zlib 压缩），记录里只存引用；
+# 共用字段（语言成绩、申请日期）和重复的 HTML（入学要求存了三份）都只存一次
+# ==============================
+class BlobStoreResultSink:
+    def __init__(self, path: Path, fsync: str = "interval", resume: bool = True,
+                 blob_min_length: int = 32, compress_min_length: int = 256):
+        # 每条记录都单独提交：任务在队列里标记完成之前，结果必须已经落盘；
+        # fsync 只决定提交时的同步级别（always=FULL，interval=NORMAL，never=OFF）
+        self.path = Path(path)
+        self.complete_marker = self.path.with_name(self.path.name + ".complete")
+        self.fsync = fsync
+        self.blob_min_length = blob_min_length
+        self.compress_min_length = compress_min_length
+        self._lock = threading.Lock()
+        self._count = 0
+        self._known_blobs = set()
+        self.done_urls = set()
+        self.stats = {"raw_bytes": 0, "stored_bytes": 0, "blobs": 0, "blob_reuses": 0}
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # 上次没跑完（没有 complete 标记）才续爬，否则重新开始
+        resuming = resume and self.path.exists() and not self.complete_marker.exists()
+        if not resuming:
+            for stale in (self.path, Path(f"{self.path}-wal"), Path(f"{self.path}-shm")):
+                if stale.exists():
+                    stale.unlink()
+        if self.complete_marker.exists():
+            self.complete_marker.unlink()
+
+        self._conn = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "PRAGMA synchronous=%s" % {"always": "FULL", "never": "OFF"}.get(fsync, "NORMAL")
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS blobs (hash TEXT PRIMARY KEY, codec TEXT, data BLOB)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS records (seq INTEGER PRIMARY KEY AUTOINCREMENT, url TEXT, body TEXT)"
+        )
+        self._conn.commit()
+
+        if resuming:
+            for (url,) in self._conn.execute("SELECT url FROM records"):
+                self._count += 1
+                self.done_urls.add(url)
+            self._known_blobs = {row[0] for row in self._conn.execute("SELECT hash FROM blobs")}
+            print(f"断点续爬: 已有 {self._count} 条结果 {self.path}")
+
+    def _blob_ref(self, value: str) -> str:
+        data = value.encode("utf-8")
+        blob_hash = hashlib.sha1(data).hexdigest()
+        if blob_hash in self._known_blobs:
+            self.stats["blob_reuses"] += 1
+            return blob_hash
+        codec = "raw"
+        if len(data) >= self.compress_min_length:
+            packed = zlib.compress(data, 6)
+            if len(packed) < len(data):
+                data, codec = packed, "zlib"
+        self._conn.execute("INSERT OR IGNORE INTO blobs (hash, codec, data) VALUES (?, ?, ?)", (blob_hash, codec, data))
+        self._known_blobs.add(blob_hash)
+        self.stats["blobs"] += 1
+        self.stats["stored_bytes"] += len(data)
+        return blob_hash
+
+    def append(self, record: Dict[str, Any]):
+        with self._lock:
+            values, refs = {}, {}
+            for key, value in record.items():
+                if isinstance(value, str) and len(value) >= self.blob_min_length:
+                    refs[key] = self._blob_ref(value)
+                else:
+                    values[key] = value
+            # 保留字段顺序，读取时按原顺序还原
+            body = json.dumps({"order": list(record), "values": values, "refs": refs}, ensure_ascii=False)
+            self._conn.execute(
+                "INSERT INTO records (url, body) VALUES (?, ?)", (record.get("major_url-href", ""), body)
+            )
+            self.stats["raw_bytes"] += len(json.dumps(record, ensure_ascii=False).encode("utf-8"))
+            self.stats["stored_bytes"] += len(body.encode("utf-8"))
+            self._count += 1
+            self._commit()
 
-    # 1）获取专业列表（从 sitemap）
-    def get_list_urls(self, tab: MixTab) -> Optional[List[Dict[str, Any]]]:
-        sitemap_path = Path(__file__).parent / 'sitemap_pg.json'
-        
-        
-        sitemap = self.get_json_data(sitemap_path)
+    def _commit(self):
+        self._conn.commit()
 
-        scraper = DrissionScraperSession()
-        major_list = scraper.run(sitemap, False)
+    def flush(self):
+        with self._lock:
+            try:
+                self._commit()
+            except sqlite3.ProgrammingError:
+                # 已关闭
+                pass
 
-        return major_list
+    def close(self, complete: bool = False):
+        with self._lock:
+            try:
+                self._commit()
+                if complete:
+                    # 跑完后合并 WAL 并整理空闲页，留下单个紧凑的文件
+                    self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+                    self._conn.execute("VACUUM")
+                self._conn.close()
+            except sqlite3.ProgrammingError:
+                pass
+        if complete:
+            self.complete_marker.touch()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __iter__(self):
+        # 先提交，读连接才能看到本次写入的记录
+        self.flush()
+        return read_blob_results(self.path)
+
+
+class BlobResultReader:
+    def __init__(self, path: Path, blob_cache_size: int = 1024):
+        self.path = Path(path)
+        self._conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, timeout=30)
+        # 共用字段的 blob 被大量记录引用，解码结果缓存一小部分
+        self._blob_cache: Dict[str, str] = {}
+        self._blob_cache_size = blob_cache_size
+
+    def _blob(self, blob_hash: str) -> str:
+        value = self._blob_cache.get(blob_hash)
+        if value is not None:
+            return value
+        row = self._conn.execute("SELECT codec, data FROM blobs WHERE hash = ?", (blob_hash,)).fetchone()
+        if not row:
+            return ""
+        data = zlib.decompress(row[1]) if row[0] == "zlib" else row[1]
+        value = data.decode("utf-8")
+        if len(self._blob_cache) >= self._blob_cache_size:
+            self._blob_cache.pop(next(iter(self._blob_cache)))
+        self._blob_cache[blob_hash] = value
+        return value
+
+    def _rebuild(self, body: str) -> Dict[str, Any]:
+        # 还原成原来的扁平 dict
+        stored = json.loads(body)
+        values, refs = stored["values"], stored["refs"]
+        return {key: self._blob(refs[key]) if key in refs else values.get(key) for key in stored["order"]}
+
+    def __iter__(self):
+        for (body,) in self._conn.execute("SELECT body FROM records ORDER BY seq"):
+            yield self._rebuild(body)
+
+    def get(self, url: str) -> Optional[Dict[str, Any]]:
+        # 同一 URL 有多条时取最后一条
+        row = self._conn.execute(
+            "SELECT body FROM records WHERE url = ? ORDER BY seq DESC LIMIT 1", (url,)
+        ).fetchone()
+        return self._rebuild(row[0]) if row else None
+
+    def close(self):
+        self._conn.close()
+
+
+def read_blob_results(path: Path):
+    path = Path(path)
+    if not path.exists():
+        return
+    reader = BlobResultReader(path)
+    try:
+        yield from reader
+    finally:
+        reader.close()
+
+
+def read_results(path: Path):
+    # 按文件类型读取结果，统一返回扁平 dict
+    if Path(path).suffix == ".sqlite3":
+        return read_blob_results(path)
+    return read_jsonl(path)
+
+
+# ==============================
+# 输出槽位：同一台机器上多个进程一起消费任务队列时，每个进程独占一个槽位（文件锁，进程退出自动释放），
+# 写自己的结果 / 指标文件，避免互相截断或覆盖
+# ==============================
+def try_lock_file(path: Path):
+    # 非阻塞加排他锁；拿到时返回文件句柄（关闭句柄即释放），已被其他进程锁住时返回 None
+    handle = open(path, "a+b")
+    try:
+        if fcntl is not None:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            handle.seek(0)
+            msvcrt.locking(handle.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        handle.close()
+        return None
+    return handle
+
+
+class OutputSlot:
+    def __init__(self, lock_dir: Path, name: str, max_slots: int = 64):
+        # 槽位 0 写主文件（单进程时与原来一致），槽位 n 写 {name}_worker{n}
+        self.lock_dir = Path(lock_dir)
+        self.name = name
+        self.lock_dir.mkdir(parents=True, exist_ok=True)
+        self.index, self._handle = None, None
+        for index in range(max_slots):
+            handle = try_lock_file(self.lock_path(index))
+            if handle is not None:
+                self.index, self._handle = index, handle
+                break
+        if self._handle is None:
+            raise RuntimeError(f"输出槽位已用完（{max_slots} 个）: {name}")
+
+    def lock_path(self, index: int) -> Path:
+        return self.lock_dir / f".{self.name}.slot{index}.lock"
+
+    @property
+    def suffix(self) -> str:
+        return f"_worker{self.index}" if self.index else ""
+
+    def lock_others(self) -> Optional[Dict[int, Any]]:
+        # 锁住其他所有槽位（说明对应进程都已退出），返回 {序号: 句柄}；还有槽位在使用时返回 None
+        held: Dict[int, Any] = {}
+        indexes = {int(path.name.rsplit(".slot", 1)[1].split(".")[0])
+                   for path in self.lock_dir.glob(f".{self.name}.slot*.lock")}
+        # 槽位 0（主文件）总要锁住，合并期间不让新进程接手主文件
+        for index in sorted((indexes | {0}) - {self.index}):
+            handle = try_lock_file(self.lock_path(index))
+            if handle is None:
+                self.release(held)
+                return None
+            held[index] = handle
+        return held
+
+    @staticmethod
+    def release(handles: Dict[int, Any]):
+        for handle in handles.values():
+            handle.close()
+
+    def close(self):
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
+
+
+class BrowserTabPool:
+    def __init__(self, browser_factory, size: int, max_uses: int = 50, max_memory_mb: Optional[float] = None,
+                 on_create=None):
+        self._browser_factory = browser_factory
+        # 新建标签页后调用（例如设置资源拦截）
+        self._on_create = on_create
+        self.size = size
+        self.max_uses = max_uses
+        self.max_memory_mb = max_memory_mb
+        self._idle: List[List[Any]] = []  # [tab, 已使用次数]
+        self._in_use = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self.stats = {"leases": 0, "created": 0, "recycled": 0}
+        atexit.register(self.close)
+
+    def _browser_memory_mb(self) -> float:
+        if psutil is None:
+            return 0.0
+        try:
+            proc = psutil.Process(self._browser_factory().process_id)
+            procs = [proc] + proc.children(recursive=True)
+            return sum(p.memory_info().rss for p in procs) / 1024 / 1024
+        except Exception:
+            return 0.0
+
+    def acquire(self, timeout: Optional[float] = None) -> List[Any]:
+        # 返回 [标签页, 已使用次数]，用完必须交给 release；一般用 lease()
+        with self._cond:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while not self._idle and self._in_use >= self.size and not self._closed:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError(f"等待标签页超过 {timeout}s")
+                self._cond.wait(remaining)
+            if self._closed:
+                raise RuntimeError("标签页池已关闭")
+            self._in_use += 1
+            self.stats["leases"] += 1
+            if self._idle:
+                return self._idle.pop()
+        try:
+            tab = self._browser_factory().new_tab()
+            if self._on_create is not None:
+                self._on_create(tab)
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self.stats["created"] += 1
+        return [tab, 0]
+
+    def release(self, entry: List[Any], broken: bool = False):
+        entry[1] += 1
+        recycle = (
+            broken
+            or self._closed
+            or entry[1] >= self.max_uses
+            or (self.max_memory_mb and self._browser_memory_mb() > self.max_memory_mb)
+        )
+        if recycle:
+            self._close_tab(entry[0])
+        else:
+            try:
+                # 归还前切到空白页，释放页面占用的内存
+                entry[0].get("about:blank")
+            except Exception:
+                self._close_tab(entry[0])
+                recycle = True
+        with self._cond:
+            self._in_use -= 1
+            if recycle:
+                self.stats["recycled"] += 1
+            else:
+                self._idle.append(entry)
+            self._cond.notify()
 
-    # ==============================
-    # 2）解析详情页
-    # ==============================
-    def scrape_detail_page(self, page: MixTab, major_info: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-        err_list = []
-        major_url = major_info.get("major_url-href", "")
+    @staticmethod
+    def _close_tab(tab):
+        try:
+            tab.close()
+        except Exception:
+            pass
 
-        if not major_url:
-            return ScrapeResult(
-                data={},
-                err_info={"url": "", "err_list": ["major_url-href为空"]}
+    @contextmanager
+    def lease(self, timeout: Optional[float] = None):
+        entry = self.acquire(timeout)
+        broken = False
+        try:
+            yield entry[0]
+        except Exception:
+            broken = True
+            raise
+        finally:
+            self.release(entry, broken)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._cond.notify_all()
+        for tab, _ in idle:
+            self._close_tab(tab)
+
+
+class LazyTabLease:
+    # 流水线模式：按需从池里租标签页，静态页面只有真正需要浏览器时才占用
+    def __init__(self, pool: BrowserTabPool):
+        self._pool = pool
+        self._entry: Optional[List[Any]] = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        with self._lock:
+            if self._entry is None:
+                self._entry = self._pool.acquire()
+            return self._entry[0]
+
+    def release(self, broken: bool = False):
+        with self._lock:
+            entry, self._entry = self._entry, None
+        if entry is not None:
+            self._pool.release(entry, broken)
+
+
+# ==============================
+# 资源拦截：详情页和辅助标签页不加载图片、字体、视频和第三方统计/挂件
+# ==============================
+RESOURCE_TYPE_EXTENSIONS = {
+    "image": ["jpg", "jpeg", "png", "gif", "webp", "svg", "ico", "avif"],
+    "font": ["woff", "woff2", "ttf", "otf", "eot"],
+    "media": ["mp4", "webm", "mp3", "m3u8"],
+}
+
+def wildcard_pattern(pattern: str):
+    # 与 Chrome blocked_urls 一致：只有 * 是通配符，? 等字符按字面匹配
+    return re.compile(".*".join(re.escape(part) for part in pattern.split("*")) + r"\Z")
+
+
+class ResourceBlockProfile:
+    def __init__(self, mode: str, blocked_types, blocked_hosts, allowed_hosts):
+        # mode: block=拦截，audit=不拦截只统计可节省的字节，off=不处理
+        self.mode = mode
+        # 扩展名要么在末尾要么紧跟 ?，避免误伤 jquery.iconify.js 这类文件名
+        self.type_patterns = [
+            p
+            for t in blocked_types
+            for ext in RESOURCE_TYPE_EXTENSIONS[t]
+            for p in (f"*.{ext}", f"*.{ext}?*")
+        ]
+        # 白名单里的域名（申请弹窗需要的）永远不按域名拦截
+        self.allowed_hosts = list(allowed_hosts)
+        self.host_patterns = [
+            f"*://{host}/*" for host in blocked_hosts if not self._allowed(host)
+        ]
+        self._compiled = [wildcard_pattern(p) for p in self.patterns()]
+
+    def _allowed(self, host: str) -> bool:
+        return any(wildcard_pattern(allowed).match(host) for allowed in self.allowed_hosts)
+
+    def patterns(self) -> List[str]:
+        return self.type_patterns + self.host_patterns
+
+    def matches(self, url: str) -> bool:
+        # 与浏览器侧 blocked_urls 相同的通配规则，用于统计
+        return any(p.match(url) for p in self._compiled)
+
+    def apply(self, tab):
+        if self.mode != "block" or getattr(tab, "_resource_profile_applied", False):
+            return
+        tab.set.blocked_urls(self.patterns())
+        tab._resource_profile_applied = True
+
+
+class NetworkUsageTracker:
+    # 用 CDP Network 事件统计一个标签页的请求：loadingFinished 的 encodedDataLength 是实际传输字节数，
+    # 跨域资源也有（Resource Timing 的 transferSize 在没有 Timing-Allow-Origin 时是 0，正好漏掉第三方资源）；
+    # loadingFailed 带 blockedReason 的是被 blocked_urls 拦截的请求
+    def __init__(self, tab):
+        self._lock = threading.Lock()
+        self._urls: Dict[str, str] = {}
+        self._finished: List[Any] = []
+        self._blocked: List[str] = []
+        tab.run_cdp("Network.enable")
+        tab.driver.set_callback("Network.requestWillBeSent", self._on_request)
+        tab.driver.set_callback("Network.loadingFinished", self._on_finished)
+        tab.driver.set_callback("Network.loadingFailed", self._on_failed)
+
+    def _on_request(self, **params):
+        with self._lock:
+            self._urls[params["requestId"]] = params.get("request", {}).get("url", "")
+
+    def _on_finished(self, **params):
+        with self._lock:
+            url = self._urls.pop(params["requestId"], "")
+            self._finished.append((url, int(params.get("encodedDataLength") or 0)))
+
+    def _on_failed(self, **params):
+        with self._lock:
+            url = self._urls.pop(params["requestId"], "")
+            if params.get("blockedReason"):
+                self._blocked.append(url)
+
+    def take(self):
+        # 返回并清空上次 take 之后的 ([(url, 字节数)], [被拦截的 url])
+        with self._lock:
+            finished, self._finished = self._finished, []
+            blocked, self._blocked = self._blocked, []
+        return finished, blocked
+
+
+class ResourceLoadStats:
+    def __init__(self, profile: ResourceBlockProfile):
+        self.profile = profile
+        self._lock = threading.Lock()
+        self.pages = 0
+        self.load_seconds = 0.0
+        self.bytes_loaded = 0
+        # block 模式：被拦截的请求数；audit 模式：命中规则的请求数和字节数（即可节省的量）
+        self.matched_requests = 0
+        self.matched_bytes = 0
+
+    def record(self, finished, blocked, load_seconds: float):
+        loaded = matched = matched_bytes = 0
+        for url, size in finished or []:
+            loaded += size
+            if self.profile.matches(url):
+                matched += 1
+                matched_bytes += size
+        if self.profile.mode == "block":
+            matched += len(blocked or [])
+        with self._lock:
+            self.pages += 1
+            self.load_seconds += load_seconds
+            self.bytes_loaded += loaded
+            self.matched_requests += matched
+            self.matched_bytes += matched_bytes
+
+    def report_lines(self) -> List[str]:
+        if not self.pages:
+            return []
+        lines = [
+            f"资源加载（{self.profile.mode}）: {self.pages} 次浏览器加载，平均 {self.load_seconds / self.pages:.2f}s，"
+            f"平均下载 {self.bytes_loaded / self.pages / 1024:.0f} KB"
+        ]
+        if self.profile.mode == "audit":
+            lines.append(
+                f"  命中拦截规则 {self.matched_requests} 个请求，可节省 {self.matched_bytes / 1024:.0f} KB"
+                f"（{self.matched_bytes / max(self.bytes_loaded, 1):.0%}）"
             )
-
+        elif self.profile.mode == "block":
+            # 被拦截的请求根本没有下载，拿不到字节数；节省量需要用 audit 模式跑一次对比
+            lines.append(f"  已拦截 {self.matched_requests} 个请求（未下载，节省的字节数见 audit 模式）")
+        return lines
+
+
+# ==============================
+# 每页各阶段耗时 + 浏览器往返次数，结束时汇总分位数
+# ==============================
+class PageMetrics:
+    def __init__(self, url: str):
+        self.url = url
+        self.stages: Dict[str, float] = {}
+        self.roundtrips = 0
+        # 供自适应并发使用：是否占用名额、加载是否失败 / 超时
+        self.holds_slot = False
+        self.browser_loaded = False
+        # static / browser：字段来自服务器 HTML 还是浏览器渲染后的页面
+        self.engine = ""
+        self.error = False
+        self.timeout = False
+        self.started = time.perf_counter()
+        self.total = 0.0
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
         try:
-            page.get(major_url)
-            # 等待文档加载完成
-            page.wait.doc_loaded()
-            # 增加固定等待时间，让页面完全加载
-            page.wait(4)  # 等待4秒
-        except Exception as e:
-            return ScrapeResult(
-                data={"major_url": major_url},
-                err_info={"url": major_url, "err_list": [f"页面加载失败: {e}"]}
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start
+
+    def roundtrip(self, count: int = 1):
+        self.roundtrips += count
+
+    def finish(self):
+        self.total = time.perf_counter() - self.started
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "total": round(self.total, 4),
+            "roundtrips": self.roundtrips,
+            "engine": self.engine,
+            "stages": {name: round(seconds, 4) for name, seconds in self.stages.items()},
+        }
+
+
+class MetricsCollector:
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._file = open(self.path, "w", encoding="utf-8")
+        self.stage_samples: Dict[str, List[float]] = {}
+        self.total_samples: List[float] = []
+        self.roundtrip_samples: List[int] = []
+
+    def record(self, metrics: PageMetrics):
+        metrics.finish()
+        line = json.dumps(metrics.to_dict(), ensure_ascii=False)
+        with self._lock:
+            if not self._file.closed:
+                self._file.write(line + "\n")
+                self._file.flush()
+            self.total_samples.append(metrics.total)
+            self.roundtrip_samples.append(metrics.roundtrips)
+            for name, seconds in metrics.stages.items():
+                self.stage_samples.setdefault(name, []).append(seconds)
+
+    @staticmethod
+    def percentile(values: List[float], pct: float) -> float:
+        if not values:
+            return 0.0
+        # nearest-rank：第 ceil(pct/100 * n) 个值
+        ordered = sorted(values)
+        index = min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))
+        return ordered[index]
+
+    def report_lines(self) -> List[str]:
+        with self._lock:
+            stages = {name: list(v) for name, v in self.stage_samples.items()}
+            totals = list(self.total_samples)
+            roundtrips = list(self.roundtrip_samples)
+        if not totals:
+            return []
+
+        pct = self.percentile
+        lines = [
+            f"{'阶段':<24}{'次数':>6}{'p50':>9}{'p90':>9}{'p99':>9}{'max':>9}{'合计':>10}",
+        ]
+        for name, values in sorted(stages.items(), key=lambda kv: -sum(kv[1])):
+            lines.append(
+                f"{name:<24}{len(values):>6}{pct(values, 50):>9.2f}{pct(values, 90):>9.2f}"
+                f"{pct(values, 99):>9.2f}{max(values):>9.2f}{sum(values):>10.1f}"
             )
-        # ========== 专业名称 major_name ==========
+        lines.append(
+            f"{'total':<24}{len(totals):>6}{pct(totals, 50):>9.2f}{pct(totals, 90):>9.2f}"
+            f"{pct(totals, 99):>9.2f}{max(totals):>9.2f}{sum(totals):>10.1f}"
+        )
+        lines.append(
+            f"浏览器往返/页: p50 {pct(roundtrips, 50):.0f}，p90 {pct(roundtrips, 90):.0f}，max {max(roundtrips)}"
+        )
+        return lines
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+
+# ==============================
+# 自适应并发：按页面加载耗时、错误/超时率和本机负载调整同时在抓的详情页数量
+# ==============================
+class AdaptiveConcurrency:
+    def __init__(self, initial: int, minimum: int, ceiling: int, target_latency: float,
+                 window: int = 10, cpu_limit: float = 85.0, memory_limit: float = 85.0):
+        self.minimum = minimum
+        self.ceiling = ceiling
+        self.limit = max(minimum, min(initial, ceiling))
+        self.target_latency = target_latency
+        self.window = window
+        self.cpu_limit = cpu_limit
+        self.memory_limit = memory_limit
+        self._in_flight = 0
+        self._samples: List[Any] = []
+        self._cond = threading.Condition()
+        self._start = time.time()
+        self.history = [(0.0, self.limit, "初始值")]
+
+    def acquire(self):
+        with self._cond:
+            while self._in_flight >= self.limit:
+                self._cond.wait()
+            self._in_flight += 1
+
+    def release(self, latency: float, error: bool = False, timeout: bool = False):
+        with self._cond:
+            self._in_flight -= 1
+            self._samples.append((latency, error, timeout))
+            if len(self._samples) >= self.window:
+                self._adjust()
+            self._cond.notify_all()
+
+    @staticmethod
+    def _host_load() -> Any:
+        # 返回 (CPU%, 内存%)；没有 psutil 时用 loadavg 估算 CPU，内存不参与判断
+        if psutil is not None:
+            return psutil.cpu_percent(interval=None), psutil.virtual_memory().percent
         try:
-            h1_text = page.ele("x://h1[@class='page-banner__title']", timeout=10).text.strip()
-            h3_text = ""
-            try:
-                h3_element = page.ele("x://h3[@data-role='banner-major-title']", timeout=2)
-                if h3_element:
-                    h3_text = h3_element.text.strip()
-            except:
-                pass
+            return os.getloadavg()[0] / (os.cpu_count() or 1) * 100, 0.0
+        except (AttributeError, OSError):
+            return 0.0, 0.0
+
+    def _adjust(self):
+        samples, self._samples = self._samples, []
+        latencies = sorted(s[0] for s in samples)
+        median = latencies[len(latencies) // 2]
+        error_rate = sum(1 for s in samples if s[1]) / len(samples)
+        timeout_rate = sum(1 for s in samples if s[2]) / len(samples)
+        cpu, memory = self._host_load()
+
+        new_limit, reason = self.limit, ""
+        if error_rate + timeout_rate > 0.2:
+            new_limit = int(self.limit * 0.7)
+            reason = f"错误率 {error_rate:.0%} / 超时率 {timeout_rate:.0%}"
+        elif cpu > self.cpu_limit or memory > self.memory_limit:
+            new_limit = int(self.limit * 0.7)
+            reason = f"本机负载 CPU {cpu:.0f}% / 内存 {memory:.0f}%"
+        elif median > self.target_latency * 1.5:
+            new_limit = self.limit - 1
+            reason = f"加载变慢 p50 {median:.1f}s"
+        elif median < self.target_latency and cpu < self.cpu_limit - 20:
+            new_limit = self.limit + 1
+            reason = f"加载正常 p50 {median:.1f}s，CPU {cpu:.0f}%"
+
+        new_limit = max(self.minimum, min(self.ceiling, new_limit))
+        if new_limit != self.limit:
+            self.limit = new_limit
+            self.history.append((time.time() - self._start, new_limit, reason))
+            print(f"[并发] 调整为 {new_limit}：{reason}")
+
+    def average_limit(self) -> float:
+        # 按时间加权的平均并发
+        end = time.time() - self._start
+        points = self.history + [(end, self.limit, "")]
+        total = sum((points[i + 1][0] - points[i][0]) * points[i][1] for i in range(len(points) - 1))
+        return total / end if end > 0 else float(self.limit)
+
+
+# ==============================
+# 持久化任务队列（SQLite）：断点续跑、失败重试退避、优先级、多进程安全领取
+# ==============================
+def pid_alive(pid: int) -> bool:
+    if pid == os.getpid():
+        return True
+    if psutil is not None:
+        return psutil.pid_exists(pid)
+    if os.name == "nt":
+        # Windows 上 os.kill 会直接结束进程，没有 psutil 时保守地当作仍在运行
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class CrawlJobQueue:
+    PENDING = "pending"
+    IN_PROGRESS = "in_progress"
+    DONE = "done"
+    FAILED = "failed"
+
+    def __init__(self, path: Path, max_attempts: int = 3, backoff_base: float = 300, lease_timeout: float = 1800):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        # in_progress 超过这个时间没完成，视为进程已退出，可以被重新领取
+        self.lease_timeout = lease_timeout
+        self._lock = threading.Lock()
+        # isolation_level=None：自己控制事务，领取时用 BEGIN IMMEDIATE 加写锁
+        self._conn = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                url TEXT PRIMARY KEY,
+                payload TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                state TEXT NOT NULL,
+                priority INTEGER NOT NULL DEFAULT 0,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL DEFAULT 0,
+                claimed_by TEXT,
+                claimed_at REAL,
+                last_duration REAL,
+                last_error TEXT,
+                updated_at REAL
+            )
+            """
+        )
 
-            if h3_text:
-                major_name = f"{h1_text} {h3_text}".strip()
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
             else:
-                major_name = h1_text
+                self._conn.execute("COMMIT")
 
+    def _unfinished_clause(self) -> str:
+        return (
+            f"(state = '{self.PENDING}'"
+            f" OR (state = '{self.FAILED}' AND attempts < {int(self.max_attempts)} AND next_attempt_at <= :now)"
+            f" OR (state = '{self.IN_PROGRESS}' AND claimed_at < :stale))"
+        )
 
-            major_name_lower = major_name.lower()
-            if any(t in major_name_lower for t in ['doctor of philosophy', 'phd', 'bachelor']):
-                print(f"直接跳过专业: {major_name}")
-                return None
-           
+    def _remaining_clause(self) -> str:
+        # 本轮还没有结束的任务：待处理、处理中、失败但还能重试（包括仍在退避期内的）
+        return (
+            f"(state IN ('{self.PENDING}', '{self.IN_PROGRESS}')"
+            f" OR (state = '{self.FAILED}' AND attempts < {int(self.max_attempts)}))"
+        )
 
-        except Exception as e:
-            err_list.append(f"专业名称获取失败——{e}")
-            major_name = ""
+    def reclaim_dead_claims(self) -> int:
+        # 本机上已经退出的进程留下的 in_progress 任务立即放回待处理，不必等 lease_timeout
+        host = socket.gethostname()
+        with self._transaction() as conn:
+            rows = conn.execute(
+                "SELECT url, claimed_by FROM jobs WHERE state = ?", (self.IN_PROGRESS,)
+            ).fetchall()
+            dead = []
+            for url, claimed_by in rows:
+                parts = (claimed_by or "").split(":")
+                if len(parts) >= 2 and parts[0] == host and parts[1].isdigit() and not pid_alive(int(parts[1])):
+                    dead.append(url)
+            for url in dead:
+                conn.execute(
+                    "UPDATE jobs SET state = ?, claimed_by = NULL, updated_at = ? WHERE url = ?",
+                    (self.PENDING, time.time(), url),
+                )
+        if dead:
+            print(f"[队列] 回收已退出进程的任务 {len(dead)} 个")
+        return len(dead)
+
+    def unfinished(self, urls: Optional[List[str]] = None) -> int:
+        with self._lock:
+            rows = self._conn.execute(f"SELECT url FROM jobs WHERE {self._remaining_clause()}").fetchall()
+        if urls is None:
+            return len(rows)
+        wanted = set(urls)
+        return sum(1 for (url,) in rows if url in wanted)
+
+    def begin_run(self) -> bool:
+        # 上一轮全部结束（没有未完成任务）时开始新一轮；否则接着上一轮。返回是否为新一轮
+        self.reclaim_dead_claims()
+        with self._transaction() as conn:
+            remaining = conn.execute(f"SELECT COUNT(*) FROM jobs WHERE {self._remaining_clause()}").fetchone()[0]
+            if remaining:
+                return False
+            conn.execute(
+                "UPDATE jobs SET state = ?, attempts = 0, next_attempt_at = 0, claimed_by = NULL, last_error = NULL",
+                (self.PENDING,),
+            )
+            return True
+
+    def seed(self, major_list: List[Dict[str, Any]], priorities: Dict[str, int]):
+        now = time.time()
+        with self._transaction() as conn:
+            for seq, major_info in enumerate(major_list):
+                url = major_info.get("major_url-href", "")
+                if not url:
+                    continue
+                payload = json.dumps(major_info, ensure_ascii=False)
+                conn.execute(
+                    "INSERT OR IGNORE INTO jobs (url, payload, seq, state, updated_at) VALUES (?, ?, ?, ?, ?)",
+                    (url, payload, seq, self.PENDING, now),
+                )
+                conn.execute(
+                    "UPDATE jobs SET payload = ?, seq = ?, priority = ? WHERE url = ?",
+                    (payload, seq, priorities.get(url, 0), url),
+                )
 
+    def pending_jobs(self, urls: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        # 按优先级排序；同一优先级内把历史上较慢的页面均匀穿插，避免慢页面扎堆
+        params = {"now": time.time(), "stale": time.time() - self.lease_timeout}
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT url, payload, priority, last_duration FROM jobs WHERE {self._unfinished_clause()}"
+                " ORDER BY priority DESC, seq",
+                params,
+            ).fetchall()
+            durations = sorted(
+                r[0] for r in self._conn.execute("SELECT last_duration FROM jobs WHERE last_duration IS NOT NULL")
+            )
+        if urls is not None:
+            wanted = set(urls)
+            rows = [r for r in rows if r[0] in wanted]
+        slow_threshold = durations[int(len(durations) * 0.75)] if len(durations) >= 4 else None
+
+        ordered = []
+        for priority in sorted({r[2] for r in rows}, reverse=True):
+            band = [r for r in rows if r[2] == priority]
+            slow = [r for r in band if slow_threshold is not None and (r[3] or 0) > slow_threshold]
+            fast = [r for r in band if r not in slow]
+            step = max(1, len(fast) // (len(slow) + 1)) if slow else 0
+            merged = []
+            for i, row in enumerate(fast):
+                merged.append(row)
+                if slow and step and (i + 1) % step == 0:
+                    merged.append(slow.pop(0))
+            ordered.extend(merged + slow)
+        return [json.loads(r[1]) for r in ordered]
+
+    def claim(self, url: str, worker_id: str) -> bool:
+        now = time.time()
+        params = {"now": now, "stale": now - self.lease_timeout, "url": url, "worker": worker_id}
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                f"UPDATE jobs SET state = '{self.IN_PROGRESS}', claimed_by = :worker, claimed_at = :now,"
+                f" attempts = attempts + 1, updated_at = :now WHERE url = :url AND {self._unfinished_clause()}",
+                params,
+            )
+            if cursor.rowcount == 1:
+                return True
+            # 不在队列里的 URL（没有经过 get_list_urls）不受队列管理
+            return conn.execute("SELECT 1 FROM jobs WHERE url = ?", (url,)).fetchone() is None
+
+    def complete(self, url: str, duration: float):
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE jobs SET state = ?, last_duration = ?, last_error = NULL, updated_at = ? WHERE url = ?",
+                (self.DONE, duration, time.time(), url),
+            )
 
+    def fail(self, url: str, error: str, duration: float):
+        now = time.time()
+        with self._transaction() as conn:
+            attempts = conn.execute("SELECT attempts FROM jobs WHERE url = ?", (url,)).fetchone()
+            delay = self.backoff_base * (2 ** max(0, (attempts[0] if attempts else 1) - 1))
+            conn.execute(
+                "UPDATE jobs SET state = ?, last_duration = ?, last_error = ?, next_attempt_at = ?, updated_at = ?"
+                " WHERE url = ?",
+                (self.FAILED, duration, error[:500], now + delay, now, url),
+            )
 
-        
-        # 初始化变量
-        academic_requirements = ""
-        entry_require_general_desc = ""
-        entry_require = ""
-        course_struct_desc = ""
-        degree = ""
-        faculty_name = ""
-        overview = ""
-        study_mode = ""
-        apply_url = ""
-        expected_duration = ""
-        fees = ""
-        language_require = ""
-        
-        # ---------- 学术要求 ----------
-        try:
-            academic_ele = page.ele('x://h3[contains(text(), "Admission to the Programme")]/following-sibling::ol[1]', timeout=5)
-            if academic_ele:
-                academic_requirements = academic_ele.html
-        except Exception as e:
-            err_list.append(f"academic_requirements — {e}")
-        
-        # ---------- 入学要求 ----------
-        try:
-            entry_require_general_desc_ele = page.ele('x://h3[contains(text(), "Admission to the Programme")]/following-sibling::ol[1]', timeout=5)
-            if entry_require_general_desc_ele:
-                entry_require_general_desc = entry_require_general_desc_ele.html
-        except Exception as e:
-            err_list.append(f"entry_require_general_desc — {e}")
-# ---------- 完整入学要求（通用 + 中国） ----------
-        try:
-            
-            entry_require = ""
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._conn.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall())
 
-            if entry_require_general_desc:
-                entry_require += entry_require_general_desc
+    def close(self):
+        with self._lock:
+            self._conn.close()
 
 
-        except Exception as e:
-            err_list.append(f"entry_require — {e}")
-            entry_require = ""
+# ==============================
+# 专业方向（variant）共用片段：同一资格的多个方向只提取一次
+# ==============================
+def base_qualification_url(url: str) -> str:
+    return url.split("#", 1)[0].split("?", 1)[0].rstrip("/")
 
 
+def variant_group_key(url: str, fields: Dict[str, Any]) -> str:
+    # 只有资格相同、且 #programme-structure / 结构列表 / 学费块都一模一样的方向才算同一组；
+    # 方向专属的结构或学费（往往对应方向专属的申请入口）各自单独一组
+    digest = hashlib.sha1()
+    for name in ("programme_html", "structure_html", "fees"):
+        digest.update((fields.get(name) or "").encode("utf-8"))
+        digest.update(b"\0")
+    return f"{base_qualification_url(url)}#{digest.hexdigest()}"
 
 
-        err_list = []
+class VariantFragmentCache:
+    def __init__(self):
+        self._values: Dict[Any, Any] = {}
+        self._pending: Dict[Any, threading.Event] = {}
+        self._lock = threading.Lock()
+        self.stats: Dict[str, Dict[str, int]] = {}
+
+    def _count(self, kind: str, key: str):
+        kind_stats = self.stats.setdefault(kind, {"reused": 0, "computed": 0})
+        kind_stats[key] += 1
+
+    def get_or_compute(self, kind: str, key: str, compute):
+        # 空结果不缓存，下一个方向自己再提取
+        cache_key = (kind, key)
+        while True:
+            with self._lock:
+                if cache_key in self._values:
+                    self._count(kind, "reused")
+                    return self._values[cache_key]
+                event = self._pending.get(cache_key)
+                if event is None:
+                    event = threading.Event()
+                    self._pending[cache_key] = event
+                    break
+            # 同组的另一个方向正在提取，等它的结果
+            if not event.wait(120):
+                break
 
-        # ---------- 原逻辑抓取 course_struct_desc ---------- #
+        value = None
         try:
-            course_struct_desc = ""
+            value = compute()
+            return value
+        finally:
+            with self._lock:
+                self._count(kind, "computed")
+                if value:
+                    self._values[cache_key] = value
+                if self._pending.get(cache_key) is event:
+                    del self._pending[cache_key]
+            event.set()
 
-            try:
-                struct_ele = page.ele(
-                    'x://h3[contains(., "Structure of the Programme")]/following-sibling::ol[1]',
-                    timeout=5
-                )
-                if struct_ele:
-                    course_struct_desc = struct_ele.html.strip()
-            except:
-                pass
-
-            if not course_struct_desc:
-                try:
-                    html_list = page.run_js("""
-                        let h3 = [...document.querySelectorAll('h3')]
-                                .find(e => e.textContent.includes('Structure of the Programme'));
-                        if (!h3) return [];
-                        let res = [];
-                        let n = h3.nextElementSibling;
-                        while (n && n.tagName === 'P') {
-                            res.push(n.outerHTML);
-                            n = n.nextElementSibling;
-                        }
-                        return res;
-                    """)
-                    if html_list:
-                        course_struct_desc = "\n".join(html_list)
-                except:
-                    pass
 
-        except Exception as e:
-            err_list.append(f"course_struct_desc fetch — {e}")
+class UniversityOfOtagoPgSpider(BaseSpider):
+    school_name = 'University_of_Otago'
+    major_level = 'pg'
+    # 工作线程数 = 对 otago.ac.nz 的并发上限（礼貌上限），实际同时加载的页面数由自适应并发控制
+    # 默认保持原来的 10，不随本地优化提高；需要更高的并发时在子类 / 部署配置里显式覆盖
+    max_workers = 10
+    concurrency_initial = 6
+    concurrency_min = 2
+    # 页面加载 + 就绪等待的目标耗时（秒）
+    concurrency_target_latency = 8.0
+
+    # 课程结构 / 学费只取这一年的信息
+    target_year = 2026
+
+    # 初始化用到的共用页面
+    key_dates_url = "https://www.otago.ac.nz/international/future-students/prepare-for-otago/key-dates-for-new-international-students"
+    language_requirements_url = "https://www.otago.ac.nz/future-students/entry-requirements/language-requirements"
+
+    # 本地缓存目录
+    cache_dir = Path(__file__).parent / 'cache'
+    # 结果输出：jsonl=JSONL 流式写入（output_compress 控制 gzip），blobstore=去重的 SQLite 文件
+    output_dir = Path(__file__).parent / 'output'
+    output_format = "jsonl"
+    output_compress = False
+    output_fsync = "interval"
+    # 课程名称缓存：有效期 14 天，最多 5000 条
+    course_title_cache_ttl = 14 * 24 * 3600
+    course_title_cache_max_entries = 5000
+    # 初始化数据（申请日期 + 语言要求）缓存：一年只变一两次，缓存 7 天
+    init_data_fields = ["application_start_date", "application_deadline", "start_date", "IELTS", "TOEFL", "PTE"]
+    init_cache_version = 1
+    init_cache_ttl = 7 * 24 * 3600
+    # 增量抓取：页面未变化时直接复用上次结果；超过 max_age 强制重抓
+    incremental = True
+    incremental_max_age = 30 * 24 * 3600
+    # 提取逻辑版本：字段新增或输出格式变化时加一，上次结果的版本不同就当作页面已变化重新抓取
+    extractor_version = 2
+    # 辅助标签页池（初始化、课程子页面兜底）：每个标签页用满 50 次或浏览器内存超过 4GB 时回收
+    tab_pool_max_uses = 50
+    tab_pool_max_memory_mb = 4096
+    # 课程名称浏览器兜底单独用一个小池子：详情页在流水线里会一直占着主池的标签页，
+    # 兜底再去主池排队会互相等死；租借超过 course_fallback_lease_timeout 秒直接放弃
+    course_fallback_tabs = 2
+    course_fallback_lease_timeout = 60
+    # 资源拦截：block / audit / off；申请弹窗依赖的脚本、样式和接口不在拦截范围内
+    resource_blocking = "block"
+    resource_blocked_types = ("image", "font", "media")
+    resource_blocked_hosts = (
+        "*.google-analytics.com",
+        "*.googletagmanager.com",
+        "*.doubleclick.net",
+        "*.facebook.net",
+        "*.facebook.com",
+        "*.hotjar.com",
+        "*.youtube.com",
+        "*.ytimg.com",
+        "*.vimeo.com",
+        "*.linkedin.com",
+        "*.tiktok.com",
+    )
+    resource_allowed_hosts = ("otago.ac.nz", "*.otago.ac.nz")
+    # 用 CDP Network 事件统计每次浏览器加载的下载量和被拦截的请求（包括没有 Timing-Allow-Origin 的第三方资源）
+    resource_stats = True
+    # 预筛：这些关键词的专业不抓；规则文件可强制保留 / 排除
+    excluded_programme_keywords = ['doctor of philosophy', 'phd', 'bachelor']
+    prefilter_rules_path = Path(__file__).parent / 'prefilter_rules.json'
+    prefilter_title_probe = True
+    # 任务队列：失败最多重试 3 次，退避 5 分钟起翻倍
+    job_max_attempts = 3
+    job_retry_backoff = 300
+    # 课程子页面 HTTP 并发上限
+    course_fetch_concurrency = 8
+    # 流水线模式（--pipeline）同时在处理中的专业页数；每页最多占两个线程，线程池按 2 倍开
+    pipeline_in_flight = 32
+    # 本地 HTTP 响应缓存（所有 requests 请求：增量检查、静态详情页、课程子页面）
+    # normal=按响应缓存头，offline=只从缓存读取、不访问网络也不打开浏览器，off=不缓存
+    http_cache_mode = "normal"
+    http_cache_default_ttl = 6 * 3600  # 响应没有缓存头时的有效期
+    http_cache_ttl_override = None  # 设置后忽略响应缓存头（调试某个提取逻辑时可设为很大的值）
+    http_cache_max_bytes = 2 * 1024 ** 3
+    http_cache_max_age = 30 * 24 * 3600
+    # 每个主机的 HTTP 连接上限（详情页 worker + 课程子页面共用，连接用满时排队）；
+    # 实际取值不超过 max_workers，即自适应并发的上限，静态抓取和浏览器遵守同一个礼貌上限
+    max_http_connections = 10
+
+    # 页面就绪条件：名称 -> (定位符, 超时秒数, 是否要求可见)
+    ready_conditions = {
+        "banner_title": ("x:" + SELECTORS.xpath("banner_title"), 10, False),
+        "programme_structure": ("x:" + SELECTORS.xpath("programme_structure"), 3, False),
+        "start_application": ("x:" + SELECTORS.xpath("start_application"), 5, True),
+        "campus_options": ("x:" + SELECTORS.xpath("campus_options"), 3, True),
+        "continue_application": ("x:" + SELECTORS.xpath("continue_application"), 3, True),
+    }
+    ready_poll_interval = 0.1
+    # HTTP 优先：详情页先用连接池下载服务器 HTML 解析静态字段；
+    # 缺少这些元素（与浏览器路径等待的条件相同）时整页改用浏览器
+    static_first = True
+    static_required_selectors = ("banner_title", "programme_structure")
+
+    # apply_url 兜底时依次尝试的校区
+    apply_campuses = ["Christchurch", "Dunedin", "Wellington"]
+
+    def __init__(self, shard: Optional[tuple] = None, shared_init_data: Optional[Dict[str, str]] = None):
+        # 分片模式：shard = (序号, 总数)，只处理属于自己的专业；礼貌上限按分片数平分
+        self.shard = shard
+        self.shared_init_data = shared_init_data
+        # 分片进程自己启动的浏览器（见 _get_browser）
+        self._shard_browser = None
+        self._shard_browser_lock = threading.Lock()
+        if shard:
+            self.max_workers = max(1, type(self).max_workers // shard[1])
+            self.concurrency_initial = max(1, type(self).concurrency_initial // shard[1])
+        output_name = f'{self.school_name}_{self.major_level}'
+        if shard:
+            output_name += f'_shard{shard[0]}of{shard[1]}'
+
+        super().__init__(self.school_name, self.major_level, max_workers=self.max_workers)
+        # 非分片模式允许同一台机器上多个进程一起消费队列：每个进程占一个输出槽位，
+        # 第一个进程写主文件，其余进程写 _worker{n} 文件，本轮最后结束的进程负责合并（见 _close_output）
+        self._output_name = output_name
+        self.output_slot = None if shard else OutputSlot(self.output_dir, output_name)
+        if self.output_slot is not None:
+            output_name += self.output_slot.suffix
+        # 爬取结果直接流式写盘，after_scrape 通过迭代读取，不在内存中累积
+        self.crawled_majors = self._result_sink(output_name)
+        self.course_title_cache = CourseTitleCache(
+            self.cache_dir / 'course_titles.json',
+            ttl=self.course_title_cache_ttl,
+            max_entries=self.course_title_cache_max_entries,
+        )
+        self.init_data_cache = VersionedJsonCache(
+            self.cache_dir / 'init_data.json',
+            version=self.init_cache_version,
+            ttl=self.init_cache_ttl,
+        )
+        self.resource_profile = ResourceBlockProfile(
+            self.resource_blocking,
+            self.resource_blocked_types,
+            self.resource_blocked_hosts,
+            self.resource_allowed_hosts,
+        )
+        self.resource_stats_collector = ResourceLoadStats(self.resource_profile)
+        self.tab_pool = BrowserTabPool(
+            self._get_browser,
+            size=self.max_workers,
+            max_uses=self.tab_pool_max_uses,
+            max_memory_mb=self.tab_pool_max_memory_mb,
+            on_create=self._apply_resource_profile,
+        )
+        self.course_tab_pool = BrowserTabPool(
+            self._get_browser,
+            size=self.course_fallback_tabs,
+            max_uses=self.tab_pool_max_uses,
+            max_memory_mb=self.tab_pool_max_memory_mb,
+            on_create=self._apply_resource_profile,
+        )
+        self.http_cache = HttpResponseCache(
+            self.cache_dir / 'http',
+            mode=self.http_cache_mode,
+            default_ttl=self.http_cache_default_ttl,
+            ttl_override=self.http_cache_ttl_override,
+            max_bytes=self.http_cache_max_bytes,
+            max_age=self.http_cache_max_age,
+        )
+        self.http_session = build_http_session(
+            pool_size=min(self.max_http_connections, self.max_workers), cache=self.http_cache
+        )
+        self.course_title_fetcher = CourseTitleFetcher(
+            self.http_session,
+            max_concurrency=self.course_fetch_concurrency,
+            browser_fallback=self._load_course_title_with_browser,
+        )
+        self.page_state = PageStateStore(self.cache_dir / 'page_state.sqlite3', self.extractor_version)
+        # 本次请求拿到的校验信息，抓取成功后和结果一起写入 page_state
+        self._pending_validators: Dict[str, Dict[str, str]] = {}
+        # 增量检查下载到的 HTML，留给静态解析复用
+        self._prefetched_html: Dict[str, bytes] = {}
+        self.incremental_stats = {"unchanged": 0, "changed": 0, "new": 0, "check_failed": 0}
+        self._incremental_lock = threading.Lock()
+        self.prefilter_decisions: List[Dict[str, Any]] = []
+        # 规则文件强制保留的专业，详情页里不再按关键词跳过
+        self.prefilter_forced_urls = set()
+        # 本进程放进队列的 URL；None 表示按整个队列判断是否跑完（例如分片模式的主进程）
+        self._queued_urls: Optional[List[str]] = None
+        self.job_queue = CrawlJobQueue(
+            self.cache_dir / 'job_queue.sqlite3',
+            max_attempts=self.job_max_attempts,
+            backoff_base=self.job_retry_backoff,
+        )
+        self.concurrency = AdaptiveConcurrency(
+            initial=self.concurrency_initial,
+            minimum=self.concurrency_min,
+            ceiling=self.max_workers,
+            target_latency=self.concurrency_target_latency,
+        )
+        self.variant_cache = VariantFragmentCache()
+        # static=服务器 HTML 解析，browser=整页用浏览器，apply_browser=静态页面只为 apply_url 打开浏览器
+        self.engine_stats = {"static": 0, "browser": 0, "apply_browser": 0}
+        self._engine_lock = threading.Lock()
+        # 学费命中的版式计数，以及全文 NZ$ 扫描实际执行的次数
+        self.fee_layout_stats: Dict[str, int] = {}
+        self.fee_fallback_scans = 0
+        self._fee_stats_lock = threading.Lock()
+        # 每页耗时 / 浏览器往返次数指标
+        self._metrics_local = threading.local()
+        self.metrics = MetricsCollector(self.output_dir / f'{output_name}_metrics.jsonl')
+        # 就绪等待统计
+        self._ready_lock = threading.Lock()
+        self.ready_wait_stats = {"waits": 0, "seconds": 0.0, "timeouts": 0}
+        # 需要走校区兜底的专业，用于统计节省的页面加载
+        self._apply_lock = threading.Lock()
+        self.apply_fallback_urls: List[str] = []
+
+    def _result_sink(self, output_name: str):
+        if self.output_format == "blobstore":
+            return BlobStoreResultSink(self.output_dir / f'{output_name}.sqlite3', fsync=self.output_fsync)
+        return JsonlResultSink(
+            self.output_dir / f'{output_name}.jsonl',
+            compress=self.output_compress,
+            fsync=self.output_fsync,
+        )
 
+    def _result_path(self, output_name: str) -> Path:
+        if self.output_format == "blobstore":
+            return self.output_dir / f'{output_name}.sqlite3'
+        return self.output_dir / (f'{output_name}.jsonl.gz' if self.output_compress else f'{output_name}.jsonl')
+
+    def _get_browser(self):
+        # 分片模式：每个分片启动自己的 Chromium（auto_port 自动分配空闲端口和独立的临时用户目录），
+        # 否则所有分片都会连到默认端口上的同一个浏览器
+        if not self.shard:
+            return super()._get_browser()
+        with self._shard_browser_lock:
+            if self._shard_browser is None:
+                self._shard_browser = Chromium(ChromiumOptions().auto_port())
+            return self._shard_browser
+
+    def _roundtrip(self, count: int = 1):
+        # 当前线程正在抓取的页面，累计浏览器往返次数
+        metrics = getattr(self._metrics_local, "current", None)
+        if metrics is not None:
+            metrics.roundtrip(count)
 
-        from lxml import etree
-        from DrissionPage import ChromiumPage
-        
-        import time
-        programme_html = ""  # ⚠️ <-- 初始化，保证后面使用安全
-        # ---------- programme_html 处理，去除2025部分 ---------- #
+    # ==============================
+    # 页面就绪等待：按 DOM 条件轮询，替代固定 sleep
+    # ==============================
+    def _condition_met(self, page, locator: str, visible: bool) -> bool:
         try:
-            # 获取包含课程结构的div元素
-            programme_div = page.ele('x://div[@id="programme-structure"]')
+            self._roundtrip(2 if visible else 1)
+            ele = page.ele(locator, timeout=0)
+            if not ele:
+                return False
+            return ele.states.is_displayed if visible else True
+        except Exception:
+            return False
+
+    def wait_ready(self, page, names: List[str], url: str = "", any_one: bool = False) -> bool:
+        start = time.perf_counter()
+        pending = list(names)
+        waited: Dict[str, Optional[float]] = {}
+
+        while pending:
+            elapsed = time.perf_counter() - start
+            for name in list(pending):
+                locator, timeout, visible = self.ready_conditions[name]
+                if self._condition_met(page, locator, visible):
+                    waited[name] = elapsed
+                    pending.remove(name)
+                elif elapsed >= timeout:
+                    waited[name] = None
+                    pending.remove(name)
+            # any_one=True 时任一条件满足即可返回
+            if any_one and any(v is not None for v in waited.values()):
+                break
+            if pending:
+                time.sleep(self.ready_poll_interval)
+
+        total = time.perf_counter() - start
+        timeouts = [name for name, v in waited.items() if v is None]
+        with self._ready_lock:
+            self.ready_wait_stats["waits"] += 1
+            self.ready_wait_stats["seconds"] += total
+            self.ready_wait_stats["timeouts"] += len(timeouts)
+
+        detail = ", ".join(
+            f"{name}={v:.2f}s" if v is not None else f"{name}=超时({self.ready_conditions[name][1]}s)"
+            for name, v in waited.items()
+        )
+        print(f"[就绪] {url} 等待 {total:.2f}s: {detail}")
 
-            # 如果找到该div元素，提取HTML并删除2025部分
-            if programme_div:
-                programme_html = programme_div.html.strip()
+        if any_one:
+            return any(v is not None for v in waited.values())
+        return not timeouts
 
-                # 使用lxml解析HTML内容
-                tree = etree.HTML(programme_html)
+    def _load_course_title_with_browser(self, url: str) -> str:
+        # 兜底：HTTP 拿不到标题时，用浏览器打开子页面抓 <h1 class="page-banner__title">
+        if self.http_cache.offline:
+            return ""
+        try:
+            with self.course_tab_pool.lease(timeout=self.course_fallback_lease_timeout) as tab:
+                tab.get(url, timeout=20)
+                ele = tab.ele("x:" + SELECTORS.xpath("course_title"), timeout=5)
+                return ele.text.strip() if ele else ""
+        except Exception:
+            return ""
 
-                # 查找包含 "2025" 的 <h3> 元素
-                h3_2025 = tree.xpath('//h3[contains(text(), "2025")]')
+    # ==============================
+    # 0）初始化：申请日期 + 语言要求（所有专业共用）
+    # ==============================
+    def _shared_page_tree(self, url: str, check_selector: str, **variables):
+        # 先走 HTTP（经过本地响应缓存），页面里找不到关键元素时才用浏览器渲染；只取一次 HTML，选择器在本地求值
+        try:
+            resp = self.http_session.get(url, timeout=40)
+            resp.raise_for_status()
+            tree = etree.HTML(resp.content)
+            if tree is not None and SELECTORS.find(check_selector, tree, **variables) is not None:
+                return tree
+        except Exception as e:
+            print(f" HTTP 获取失败，改用浏览器 {url}: {e}")
+        if self.http_cache.offline:
+            raise RuntimeError(f"离线模式，缓存中没有 {url}")
+        with self.tab_pool.lease() as tab:
+            tab.get(url, timeout=40)
+            tab.wait.doc_loaded()
+            return etree.HTML(tab.html)
 
-                # 如果找到了包含2025的 <h3>，删除它及其后面的兄弟节点
-                if h3_2025:
-                    h3_2025 = h3_2025[0]  # 获取第一个包含 "2025" 的 <h3> 元素
-                    parent = h3_2025.getparent()  # 获取父节点
+    def _fetch_key_dates(self) -> Dict[str, str]:
+        print(" 获取申请日期...")
+        data = {"application_start_date": "", "application_deadline": "", "start_date": ""}
+        tree = self._shared_page_tree(self.key_dates_url, "key_dates_start")
 
-                    # 获取 <h3>2025</h3> 之后的第一个兄弟节点
-                    next_node = h3_2025.getnext()
+        # 开始时间
+        try:
+            data["application_start_date"] = element_text(SELECTORS.find("key_dates_start", tree))
+        except:
+            pass
 
-                    # 循环删除2025部分及其后续兄弟节点，直到找到包含 "2026" 的 <h3>
-                    while next_node is not None:
-                        # 删除当前节点
-                        parent.remove(next_node)
+        # 截止日期
+        try:
+            d1 = element_text(SELECTORS.find("key_dates_deadline", tree))
+            d2 = element_text(SELECTORS.find("key_dates_deadline_extra", tree))
+            data["application_deadline"] = f"{d1}  {d2}"
+        except:
+            pass
 
-                        # 如果遇到包含 "2026" 的 <h3> 则停止删除
-                        if next_node.tag == 'h3' and '2026' in next_node.text:
-                            break
+        # 开学日期
+        try:
+            texts = [element_text(e) for e in SELECTORS.find_all("key_dates_semester", tree)]
+            s1, s2 = "", ""
+            for t in texts:
+                if "semester 1" in t.lower():
+                    s1 = t
+                if "semester 2" in t.lower():
+                    s2 = t
+            data["start_date"] = f"{s1} {s2}".strip()
+        except:
+            pass
 
-                        # 获取下一个兄弟节点
-                        next_node = next_node.getnext()
+        print(" 申请日期完成")
+        return data
 
-                    # 删除 <h3>2025</h3> 节点本身
-                    parent.remove(h3_2025)
+    def _fetch_language_requirements(self) -> Dict[str, str]:
+        print(" 获取语言要求...")
+        data = {"IELTS": "", "TOEFL": "", "PTE": ""}
+        tree = self._shared_page_tree(self.language_requirements_url, "language_score", test="IELTS")
 
-                # 如果没有找到包含 "2025" 的 <h3>，则保留整个div，什么都不做
-                else:
-                    # 保留原 div 内容，无需删除
-                    pass
+        for test_name in data:
+            try:
+                data[test_name] = element_text(SELECTORS.find("language_score", tree, test=test_name))
+            except:
+                pass
 
-                # 重新将处理后的HTML转换为字符串
-                programme_html = etree.tostring(tree, pretty_print=True, encoding="unicode")
+        print("语言要求完成")
+        return data
 
-        except Exception as e:
-            programme_html = ""
-            print(f"错误: {e}")
+    def initialize(self):
 
+        print("====== 初始化开始 ======")
 
+        # ------- 统一默认值，防止异常中断 -------
+        shared = {key: "" for key in self.init_data_fields}
+
+        # 分片模式下由主进程算好传进来，直接使用
+        cached = self.shared_init_data or self.init_data_cache.load()
+        if cached is not None:
+            # 缓存有效：直接使用，不打开浏览器
+            shared.update({k: v for k, v in cached.items() if k in shared})
+            print(" 使用本地缓存的申请日期/语言要求")
+        else:
+            ok = True
+
+            # 两个页面互不依赖，并发抓取
+            with ThreadPoolExecutor(max_workers=2, thread_name_prefix="initialize") as executor:
+                futures = {
+                    "申请日期": executor.submit(self._fetch_key_dates),
+                    "语言要求": executor.submit(self._fetch_language_requirements),
+                }
+                for label, future in futures.items():
+                    try:
+                        shared.update(future.result())
+                    except Exception as e:
+                        ok = False
+                        print(f" {label}失败:", e)
 
+            # 全部字段都拿到时才写缓存，避免把不完整的数据缓存下来
+            if ok and all(shared.values()):
+                self.init_data_cache.save(shared)
+            else:
+                print(" 初始化数据不完整，本次不写入缓存")
 
+        for key, value in shared.items():
+            setattr(self, key, value)
 
-        # ---------- 链接课程抓 <h1> 文本作为课程名称 ---------- #
-        try:
-            final_courses = []
-
-            if course_struct_desc:
-                links = page.run_js(f"""
-                    let div = document.createElement('div');
-                    div.innerHTML = `{course_struct_desc}`;
-                    return [...div.querySelectorAll('a')].map(a => {{
-                        return {{
-                            text: a.textContent.trim(),
-                            href: a.getAttribute('data-uw-original-href') || a.getAttribute('href')
-                        }};
-                    }});
-                """)
-
-                if links:
-                    for item in links:
-                        course_code = item["text"]
-                        href = item["href"]
-
-                        if href:
-                            try:
-                                # 进入子页面抓 <h1 class="page-banner__title"> 文本
-                                sub_page = ChromiumPage()
-                                sub_page.get(href, timeout=20)
-                                ele = sub_page.ele('x://h1[@class="page-banner__title"]')
-                                course_name = ele.text.strip() if ele else ""
-                                if course_name:
-                                    final_courses.append(f"{course_code}: {course_name}")
-                                else:
-                                    final_courses.append(course_code)
-                            except:
-                                final_courses.append(course_code)
-                        else:
-                            final_courses.append(course_code)
+        print("====== 初始化完成 ======")
+        print("IELTS:", self.IELTS)
+        print("TOEFL:", self.TOEFL)
+        print("PTE:", self.PTE)
+        print("Start date:", self.start_date)
 
-                    course_struct_desc = ", ".join(final_courses)
 
-        except Exception as e:
-            err_list.append(f"course_struct_desc — {e}")
 
-        
-        # ---------- 最终合并 program 内容，无论前面是否抓到结构 ---------- #
+    # ==============================
+    # 增量抓取：条件请求判断页面是否变化
+    # ==============================
+    def _count_incremental(self, key: str):
+        with self._incremental_lock:
+            self.incremental_stats[key] += 1
+
+    def check_unchanged(self, major_url: str) -> Optional[Dict[str, Any]]:
+        # 页面未变化时返回上次的 state（含 record），否则返回 None 并记下新的校验信息
+        state = self.page_state.get(major_url)
+        headers = {}
+        # 上次结果是旧版提取逻辑产出的，不能复用，按"已变化"统计
+        outdated = bool(state) and not self._state_current(state)
+        if state and not outdated and time.time() - (state["scraped_at"] or 0) < self.incremental_max_age:
+            if state["etag"]:
+                headers["If-None-Match"] = state["etag"]
+            if state["last_modified"]:
+                headers["If-Modified-Since"] = state["last_modified"]
+        else:
+            state = None
+
         try:
-            if programme_html:
-                course_struct_desc = f"{programme_html}\n{course_struct_desc}".strip()
+            resp = self.http_session.get(major_url, headers=headers, timeout=20)
         except Exception as e:
-            err_list.append(f"programme merge — {e}")
+            print(f"[增量] 条件请求失败 {major_url}: {e}")
+            self._count_incremental("check_failed")
+            return None
+
+        if resp.status_code == 304 and state:
+            self._count_incremental("unchanged")
+            return state
+        if resp.status_code != 200:
+            self._count_incremental("check_failed")
+            return None
+
+        validators = {
+            "etag": resp.headers.get("ETag", ""),
+            "last_modified": resp.headers.get("Last-Modified", ""),
+            "content_hash": page_fingerprint(resp.content),
+        }
+        if state and validators["content_hash"] and validators["content_hash"] == state["content_hash"]:
+            # 服务器不支持 304，但内容指纹没变
+            self._count_incremental("unchanged")
+            if validators["etag"] != state["etag"] or validators["last_modified"] != state["last_modified"]:
+                self.page_state.put(major_url, validators, state["record"])
+            return state
+
+        self._count_incremental("changed" if state or outdated else "new")
+        with self._incremental_lock:
+            self._pending_validators[major_url] = validators
+            if self.static_first:
+                self._prefetched_html[major_url] = resp.content
+        return None
+
+    def _state_current(self, state: Dict[str, Any]) -> bool:
+        return state["extractor_version"] == self.extractor_version
+
+    def remember_page_state(self, major_url: str, record: Optional[Dict[str, Any]]):
+        with self._incremental_lock:
+            validators = self._pending_validators.pop(major_url, None)
+        if validators:
+            self.page_state.put(major_url, validators, record)
 
+    # 1）获取专业列表（从 sitemap）
+    def get_list_urls(self, tab: MixTab) -> Optional[List[Dict[str, Any]]]:
+        sitemap_path = Path(__file__).parent / 'sitemap_pg.json'
         
-        # ========== 学位 degree ==========
-        try:
-            h1_text = page.ele("x://h1[@class='page-banner__title']", timeout=10).text.strip()
+        
+        sitemap = self.get_json_data(sitemap_path)
+
+        scraper = DrissionScraperSession()
+        major_list = scraper.run(sitemap, False)
+
+        # 分片模式：按 sitemap 顺序轮流分配，只保留本分片的专业
+        if major_list and self.shard:
+            index, count = self.shard
+            major_list = [m for i, m in enumerate(major_list) if i % count == index]
+            print(f"[分片 {index}/{count}] 分到 {len(major_list)} 个专业")
+
+        # 断点续爬：跳过上次已经写入结果的专业
+        done_urls = self.crawled_majors.done_urls
+        if major_list and done_urls:
+            before = len(major_list)
+            major_list = [m for m in major_list if m.get("major_url-href", "") not in done_urls]
+            print(f"断点续爬: 跳过已完成 {before - len(major_list)} 个，剩余 {len(major_list)} 个")
+
+        # 预筛：PhD / 本科等不需要的专业在进入浏览器之前就剔除
+        if major_list:
+            major_list = self.prefilter_programmes(major_list)
+
+        # 任务队列：只返回未完成的任务，新页面 / 需要重抓的页面优先
+        if major_list:
+            if self.job_queue.begin_run():
+                print("[队列] 开始新一轮")
+            self.job_queue.seed(major_list, self._job_priorities(major_list))
+            self._queued_urls = [m.get("major_url-href", "") for m in major_list]
+            major_list = self.job_queue.pending_jobs([m.get("major_url-href", "") for m in major_list])
+            print(f"[队列] 待处理 {len(major_list)} 个: {self.job_queue.counts()}")
+
+        return major_list
 
-            if "(" in h1_text and ")" in h1_text:
-                first = h1_text.find("(")
-                last = h1_text.rfind(")")
-                degree = h1_text[first + 1:last].strip()
+    def _job_priorities(self, major_list: List[Dict[str, Any]]) -> Dict[str, int]:
+        # 2 = 新页面（没有抓过），1 = 上次结果已过期，0 = 其他
+        known = {}
+        for major_info in major_list:
+            url = major_info.get("major_url-href", "")
+            state = self.page_state.get(url) if url else None
+            if state is None:
+                known[url] = 2
+            elif (not self._state_current(state)
+                  or time.time() - (state["scraped_at"] or 0) >= self.incremental_max_age):
+                known[url] = 1
             else:
-                degree = ""
+                known[url] = 0
+        return known
 
-        except Exception as e:
-            err_list.append(f"学位获取失败——{e}")
-            degree = ""
-        
-        # ========== 学院名称 faculty ==========
+    # ==============================
+    # 预筛：按 URL / 链接文字 / HTTP 标题判断是否排除
+    # ==============================
+    def _load_prefilter_rules(self) -> Dict[str, List[Any]]:
+        # 规则文件格式：{"include": [正则...], "exclude": [正则...]}，include 优先
+        rules = {"include": [], "exclude": []}
+        try:
+            with open(self.prefilter_rules_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return rules
+        except (OSError, ValueError) as e:
+            print(f"预筛规则文件读取失败，忽略: {e}")
+            return rules
+        for key in rules:
+            rules[key] = [re.compile(pattern, re.I) for pattern in data.get(key, [])]
+        return rules
+
+    def excluded_keyword(self, text: str) -> str:
+        text = (text or "").lower()
+        for keyword in self.excluded_programme_keywords:
+            if keyword in text:
+                return keyword
+        return ""
+
+    @staticmethod
+    def _programme_texts(major_info: Dict[str, Any]) -> List[str]:
+        # 只看 URL 最后一段（slug）和列表里的链接文字（sitemap 链接选择器 major_url 的文字）；
+        # 列表里的其他字段（简介、分类等）提到 bachelor 之类的词不代表专业本身是本科
+        url = major_info.get("major_url-href", "")
+        slug = url.split("?")[0].rstrip("/").rsplit("/", 1)[-1]
+        texts = [slug.replace("-", " ").replace("_", " ")]
+        link_text = major_info.get("major_url")
+        if isinstance(link_text, str) and link_text:
+            texts.append(link_text)
+        return texts
+
+    def _current_page_state(self, url: str) -> Optional[Dict[str, Any]]:
+        # 增量状态里当前提取版本、未过期的记录；没有时返回 None
+        state = self.page_state.get(url) if self.incremental and url else None
+        if not state or not self._state_current(state):
+            return None
+        if time.time() - (state["scraped_at"] or 0) >= self.incremental_max_age:
+            return None
+        return state
+
+    def _probe_title(self, url: str) -> str:
         try:
-            html = page.html
-            main_html = html.lower().split("academic divisions")[0]
+            resp = self.http_session.get(url, timeout=15)
+            resp.raise_for_status()
+            return CourseTitleFetcher.parse_title(resp.content)
+        except Exception as e:
+            print(f"[预筛] 标题探测失败 {url}: {e}")
+            return ""
+
+    def prefilter_programmes(self, major_list: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        rules = self._load_prefilter_rules()
+        decisions: Dict[int, Any] = {}
+        undecided = []
+
+        for index, major_info in enumerate(major_list):
+            url = major_info.get("major_url-href", "")
+            texts = [url] + self._programme_texts(major_info)
+
+            include = next((p for p in rules["include"] if any(p.search(t) for t in texts)), None)
+            if include:
+                decisions[index] = (True, f"规则保留 /{include.pattern}/")
+                self.prefilter_forced_urls.add(url)
+                continue
+            exclude = next((p for p in rules["exclude"] if any(p.search(t) for t in texts)), None)
+            if exclude:
+                decisions[index] = (False, f"规则排除 /{exclude.pattern}/")
+                continue
+            keyword = next((k for k in map(self.excluded_keyword, texts[1:]) if k), "")
+            if keyword:
+                decisions[index] = (False, f"URL/链接文字含 '{keyword}'")
+                continue
+            undecided.append(index)
+
+        # URL 和链接文字看不出来的：上次抓过（记录仍有效）的直接用上次的专业名称，
+        # 只有新页面 / 记录过期的才用一次 HTTP 请求读标题
+        to_probe = []
+        for index in undecided:
+            state = self._current_page_state(major_list[index].get("major_url-href", ""))
+            if state is None:
+                to_probe.append(index)
+                continue
+            record = state["record"]
+            if record is None:
+                # 上次在详情页因为标题含排除关键词被跳过
+                decisions[index] = (False, "上次抓取时已按标题排除")
+                continue
+            keyword = self.excluded_keyword(record.get("major_name") or "")
+            if keyword:
+                decisions[index] = (False, f"上次的标题 '{record['major_name']}' 含 '{keyword}'")
+
+        if self.prefilter_title_probe and to_probe:
+            with ThreadPoolExecutor(max_workers=self.course_fetch_concurrency, thread_name_prefix="prefilter") as executor:
+                titles = list(executor.map(
+                    lambda i: self._probe_title(major_list[i].get("major_url-href", "")), to_probe
+                ))
+            for index, title in zip(to_probe, titles):
+                keyword = self.excluded_keyword(title)
+                if keyword:
+                    decisions[index] = (False, f"标题 '{title}' 含 '{keyword}'")
+
+        kept = []
+        for index, major_info in enumerate(major_list):
+            keep, reason = decisions.get(index, (True, "默认保留"))
+            url = major_info.get("major_url-href", "")
+            self.prefilter_decisions.append({"url": url, "keep": keep, "reason": reason})
+            if keep:
+                kept.append(major_info)
+            else:
+                print(f"[预筛] 排除 {url}: {reason}")
 
-            divisions = [
-                "Division of Health Sciences",
-                "Division of Humanities",
-                "Division of Sciences",
-                "Otago Business School",
-            ]
+        print(f"[预筛] 共 {len(major_list)} 个，保留 {len(kept)} 个，排除 {len(major_list) - len(kept)} 个")
+        return kept
 
-            for d in divisions:
-                if d.lower() in main_html:
-                    faculty_name = d
-                    break
-        except Exception as e:
-            faculty_name = ""
-            err_list.append(f"学院名称获取失败——{e}")
+    # ==============================
+    # 2）解析详情页
+    # ==============================
+    def scrape_detail_page(self, page: MixTab, major_info: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        # 记录每个阶段的耗时和浏览器往返次数，结束后写入指标文件
+        major_url = major_info.get("major_url-href", "")
+        metrics = self._claim_page(major_url)
+        if metrics is None:
+            return None
 
-        # ---------- 概述 ----------
+        self._metrics_local.current = metrics
         try:
-            overview = ""
+            result = self._scrape_detail_page(page, major_info, metrics)
+        except Exception as e:
+            self._finish_page(major_url, metrics, str(e))
+            raise
+        else:
+            self._finish_page(major_url, metrics, "页面加载失败" if metrics.error else None)
+            return result
+        finally:
+            self._metrics_local.current = None
+
+    def _claim_page(self, major_url: str) -> Optional["PageMetrics"]:
+        # 多进程共用队列时，先领取任务，已被其他进程领走的直接跳过
+        worker_id = f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+        if major_url and not self.job_queue.claim(major_url, worker_id):
+            print(f"[队列] 已被其他进程领取或已完成，跳过: {major_url}")
+            return None
+        return PageMetrics(major_url)
+
+    def _finish_page(self, major_url: str, metrics: "PageMetrics", error: Optional[str]):
+        elapsed = time.perf_counter() - metrics.started
+        if major_url:
+            if error:
+                self.job_queue.fail(major_url, error, elapsed)
+            else:
+                self.job_queue.complete(major_url, elapsed)
+        if metrics.holds_slot:
+            self.concurrency.release(
+                metrics.stages.get("page_load", 0.0) + metrics.stages.get("ready_wait", 0.0),
+                error=metrics.error,
+                timeout=metrics.timeout,
+            )
+        self.metrics.record(metrics)
 
-            # 1) 先找 id=overview 的 h2 或 div/section 容器
-            title = page.ele('x://h2[@id="overview"]')
+    def _scrape_detail_page(self, page: MixTab, major_info: Dict[str, Any], metrics: "PageMetrics") -> Optional[Dict[str, Any]]:
+        err_list = []
+        major_url = major_info.get("major_url-href", "")
 
-            if not title:
-                # 如果没有 id=overview 的 h2，则找包含 Overview 的 h2（忽略大小写）
-                title = page.ele(
-                    'x://h2[contains(translate(.,"ABCDEFGHIJKLMNOPQRSTUVWXYZ","abcdefghijklmnopqrstuvwxyz"),"overview")]'
-                )
+        if not major_url:
+            return ScrapeResult(
+                data={},
+                err_info={"url": "", "err_list": ["major_url-href为空"]}
+            )
 
-            if title:
-                parts = []
+        # ========== 增量：页面没变化就复用上次结果，不打开浏览器 ==========
+        with metrics.stage("incremental_check"):
+            reused, result = self._reuse_unchanged(major_url)
+        if reused:
+            return result
+
+        # ========== HTTP 优先：静态字段直接从服务器 HTML 解析 ==========
+        snapshot = None
+        if self.static_first:
+            with metrics.stage("static_fetch"):
+                snapshot = self._static_snapshot(major_url)
+        if snapshot is None:
+            # 静态 HTML 缺少关键元素（需要 JS 渲染）或请求失败，整页改用浏览器
+            snapshot, result = self._browser_snapshot(page, major_url, metrics)
+            if snapshot is None:
+                return result
+        else:
+            metrics.engine = "static"
+        self._count_engine(metrics.engine)
+
+        fields = self._extract_fields(snapshot, major_url, metrics, err_list)
+        if fields is None:
+            return None
+        course_struct_desc = self._course_struct_desc(fields, major_url, metrics, err_list)
+        apply_url = self._apply_url(lambda: page, major_url, fields, metrics, err_list)
+        return self._finish_record(major_url, fields, course_struct_desc, apply_url, metrics, err_list)
+
+    def _reuse_unchanged(self, major_url: str):
+        # 返回 (是否复用, 结果)
+        if not self.incremental:
+            return False, None
+        state = self.check_unchanged(major_url)
+        if state is None:
+            return False, None
+        print(f"[增量] 未变化，复用上次结果: {major_url}")
+        record = state["record"]
+        if record is None:
+            # 上次就是被跳过的专业
+            return True, None
+        # 共用字段（申请日期、语言成绩）以本次初始化结果为准
+        record.update({key: getattr(self, key) for key in self.init_data_fields})
+        self.crawled_majors.append(record)
+        return True, ScrapeResult(data=record, err_info={"url": major_url, "err_list": []})
+
+    def _browser_snapshot(self, page: MixTab, major_url: str, metrics: "PageMetrics"):
+        # 返回 (快照, 失败时的结果)
+        metrics.engine = "browser"
+        try:
+            self._load_in_browser(page, major_url, metrics, wait_fields=True)
+        except Exception as e:
+            return None, ScrapeResult(
+                data={"major_url": major_url},
+                err_info={"url": major_url, "err_list": [f"页面加载失败: {e}"]}
+            )
+        # ========== 页面快照：page.html 只取一次，后续字段在本地解析 ==========
+        try:
+            with metrics.stage("snapshot"):
+                html = page.html
+                metrics.roundtrip()
+                return DetailPageSnapshot(html, major_url), None
+        except Exception as e:
+            # 没有写出结果，交给队列重试
+            metrics.error = True
+            return None, ScrapeResult(
+                data={"major_url": major_url},
+                err_info={"url": major_url, "err_list": [f"页面快照失败: {e}"]}
+            )
 
-                # 2) 从下一个兄弟节点开始
-                sib = title.next()
+    def _extract_fields(self, snapshot: "DetailPageSnapshot", major_url: str, metrics: "PageMetrics",
+                        err_list: List[str]) -> Optional[Dict[str, Any]]:
+        # 快照上的本地字段；返回 None 表示该专业被排除
+        fields: Dict[str, Any] = {}
 
-                # 3) 连续抓 <p>，直到不是 p 停止
-                while sib:
-                    if sib.tag != "p":
-                        break
+        # ========== 专业名称 major_name ==========
+        with metrics.stage("major_name"):
+            try:
+                fields["major_name"] = snapshot.major_title()
+                if not fields["major_name"]:
+                    raise ValueError("未找到 page-banner__title")
 
-                    html = sib.html
-                    if html:
-                        parts.append(html)
+                # 预筛漏掉的（标题探测失败等），这里兜底再判断一次
+                if self.excluded_keyword(fields["major_name"]) and major_url not in self.prefilter_forced_urls:
+                    print(f"直接跳过专业: {fields['major_name']}")
+                    self.remember_page_state(major_url, None)
+                    return None
 
-                    sib = sib.next()
+            except Exception as e:
+                err_list.append(f"专业名称获取失败——{e}")
+                fields["major_name"] = ""
 
-                if parts:
-                    overview = "\n".join(parts)
+        # ---------- 学术要求 / 入学要求（同一个 Admission 列表，只解析一次） ----------
+        with metrics.stage("academic_requirements"):
+            try:
+                fields["academic_requirements"] = snapshot.admission_requirements()
+            except Exception as e:
+                err_list.append(f"academic_requirements — {e}")
+                fields["academic_requirements"] = ""
+        fields["entry_require_general_desc"] = fields["academic_requirements"]
+        fields["entry_require"] = fields["entry_require_general_desc"]
 
+        # 沿用原有行为：专业名称和学术要求的错误不计入 err_list
+        del err_list[:]
 
+        # ---------- 原逻辑抓取 course_struct_desc ---------- #
+        with metrics.stage("course_struct_desc"):
+            try:
+                fields["structure_html"] = snapshot.structure_list()
+            except Exception as e:
+                err_list.append(f"course_struct_desc fetch — {e}")
+                fields["structure_html"] = ""
 
-        except Exception as e:
-            err_list.append(f"overview — {e}")
-            overview = ""
+        # ---------- programme_html 处理，只保留目标年份部分 ---------- #
+        fields["programme_html"] = ""
+        with metrics.stage("programme_html"):
+            try:
+                # 获取包含课程结构的div元素
+                programme_div = snapshot.programme_structure()
 
+                # 一次遍历去掉其他年份的部分，直接输出紧凑的片段 HTML（不带 html/body 外壳）
+                if programme_div is not None:
+                    fields["programme_html"] = filter_year_sections(programme_div, self.target_year)
 
+            except Exception as e:
+                print(f"错误: {e}")
 
-        # ========== 学习方式 study_mode ==========
-        try:
-            html_lower = page.html.lower()
+        # ========== 学位 degree ==========
+        with metrics.stage("degree"):
+            try:
+                fields["degree"] = snapshot.degree()
+            except Exception as e:
+                err_list.append(f"学位获取失败——{e}")
+                fields["degree"] = ""
 
-            if "full-time" in html_lower:
-                study_mode = "full-time"
-            elif "part-time" in html_lower:
-                study_mode = "part-time"
-            else:
-                study_mode = ""
-                err_list.append("study_mode")
-        except Exception:
-            study_mode = ""
-            err_list.append("study_mode")
+        # ========== 学院名称 faculty ==========
+        with metrics.stage("faculty"):
+            try:
+                fields["faculty_name"] = snapshot.faculty()
+            except Exception as e:
+                fields["faculty_name"] = ""
+                err_list.append(f"学院名称获取失败——{e}")
 
-        # ---------- 获取 apply_url ----------
-        try:
-            apply_url = []  # 改为列表，用于存放多个链接
-            
-            # 第一步：直接点击Start application然后获取Continue链接
+        # ---------- 概述 ----------
+        with metrics.stage("overview"):
             try:
-                btn = page.ele('x://button[contains(.,"Start application")]')
-                if btn:
-                    btn.click()
-                    page.wait(1)
-
-                a_ele = page.ele('x://a[contains(.,"Continue application")]')
-                if a_ele:
-                    href = a_ele.attr('href')
-                    if href:
-                        apply_url.append(href)
+                fields["overview"] = snapshot.overview()
             except Exception as e:
-                err_list.append(f"apply_url第一步 — {e}")
-            
-            # 第二步：如果第一步没找到，尝试三个地点的方法（收集所有找到的链接）
-            if not apply_url:
-                locations = ["Christchurch", "Dunedin", "Wellington"]
-                
-                for loc in locations:
-                    try:
-                        # 重新加载页面确保状态重置
-                        page.get(major_url)
-                        page.wait.doc_loaded()
-                        page.wait(2)
-                        
-                        # 点击Start application按钮
-                        btn = page.ele('x://button[contains(.,"Start application")]')
-                        if btn:
-                            btn.click()
-                            page.wait(1)
-                        
-                        # 点击对应地点标签
-                        if loc == "Christchurch":
-                            ele = page.ele('x://h4[text()="Christchurch"]')
-                        elif loc == "Dunedin":
-                            ele = page.ele('x://h4[text()="Dunedin"]')
-                        else:  # Wellington
-                            ele = page.ele('x://h4[text()="Wellington"]')
-                        
-                        ele.parent().click()
-                        page.wait(1)
-                        
-                        # 获取Continue链接
-                        a_ele = page.ele('x://a[contains(.,"Continue application")]')
-                        if a_ele:
-                            href = a_ele.attr('href')
-                            if href:
-                                apply_url.append(href)  # 收集所有找到的链接，不break
-                                
-                    except Exception as e:
-                        err_list.append(f"apply_url{loc}地点 — {e}")
-                        continue  # 继续尝试下一个地点
+                err_list.append(f"overview — {e}")
+                fields["overview"] = ""
 
-        except Exception as e:
-            err_list.append(f"apply_url — {e}")
-            apply_url = []
+        # ========== 学习方式 study_mode ==========
+        with metrics.stage("study_mode"):
+            try:
+                fields["study_mode"] = snapshot.study_mode()
+                if not fields["study_mode"]:
+                    err_list.append("study_mode")
+            except Exception:
+                fields["study_mode"] = ""
+                err_list.append("study_mode")
 
         # ========== 学制 ==========
-        try:
-            expected_duration_ele = page.ele('x://dt[contains(.,"Duration")]/following-sibling::dd/span', timeout=5)
-            if expected_duration_ele:
-                expected_duration = expected_duration_ele.text
-        except:
-            expected_duration = ""
+        with metrics.stage("expected_duration"):
+            try:
+                fields["expected_duration"] = snapshot.expected_duration()
+            except:
+                fields["expected_duration"] = ""
 
         # ---------- 学费 ----------
+        with metrics.stage("fees"):
+            try:
+                fees_detail = snapshot.fee_info(self.target_year)
+                self._record_fee_layout(fees_detail.pop("layout"), fees_detail.pop("fallback_scanned"))
+                fields["fees"] = fees_detail["text"]
+                fields["fees_detail"] = fees_detail
+            except Exception as e:
+                err_list.append(f"fees — {e}")
+                fields["fees"], fields["fees_detail"] = "", {}
 
-        try:
-            # 先尝试第一种结构的学费信息（qualification-info-bar结构）
-            fees_span = page.ele('x://span[contains(., "International fee 2026:")]')
-            
-            if fees_span:
-                # 获取完整文本
-                full_text = fees_span.text.strip()
-                if "to be confirmed" not in full_text.lower():
-                    # 提取学费金额
-                    fee_match = re.search(r'International fee 2026:\s*([^<]+)', full_text)
-                    if fee_match:
-                        fee_text = fee_match.group(1).strip()
-                        # 如果是数字格式，添加annual
-                        if re.search(r'\d', fee_text):
-                            fees = f"{fee_text} annual"
-                        else:
-                            fees = fee_text
-                    else:
-                        fees = full_text
-                else:
-                    fees = "To be confirmed"
-            
-            else:
-                # 尝试第二种结构的学费信息（programme-details结构）
-                fees_div = page.ele('x://div[@class="programme-details__fees-item" and contains(., "International 2026")]')
-                
-                if fees_div:
-                    # 在找到的div中查找h3元素
-                    fees_h3 = fees_div.ele('tag:h3', timeout=2)
-                    if fees_h3:
-                        fees_text = fees_h3.text.strip()
-                        if fees_text and "to be confirmed" not in fees_text.lower():
-                            fees = f"{fees_text} annual"
-                        else:
-                            fees = fees_text
-                    else:
-                        # 如果没有找到h3，尝试直接获取文本
-                        fees = fees_div.text.split("International 2026")[-1].strip()
-            
-            # 如果以上都没找到，尝试其他可能的元素
-            if 'fees' not in locals() or not fees or "to be confirmed" in str(fees).lower():
-                # 尝试查找包含"NZ$"的学费信息
-                fee_elements = page.eles('x://*[contains(text(), "NZ$") and (contains(text(), "International") or contains(text(), "2026"))]')
-                if fee_elements:
-                    for element in fee_elements:
-                        fees_text = element.text.strip()
-                        if fees_text and "to be confirmed" not in fees_text.lower():
-                            fees = f"{fees_text} annual"
-                            break
-                
-                # 最后尝试原始的路径
-                if 'fees' not in locals() or not fees or "to be confirmed" in str(fees).lower():
-                    try:
-                        fees_ele = page.ele('x://div[contains(@class,"programme-details__fees-item")]//p[contains(., "International 2026")]/following-sibling::h3[1]')
-                        if fees_ele:
-                            fees_text = fees_ele.text.strip()
-                            if fees_text and "to be confirmed" not in fees_text.lower():
-                                fees = f"{fees_text} annual"
-                            else:
-                                fees = fees_text
-                    except:
-                        pass
-            
-            # 如果最终都没有找到学费信息，设为空字符串
-            if 'fees' not in locals():
-                fees = ""
-            
-        except Exception as e:
-            err_list.append(f"fees — {e}")
-            fees = ""
         # ---------- 英语语言要求 ----------
-        try:
-            language_require = ""
-
-            # 1) 找到包含 English language requirements 的 h2 / h3 / h4
-            title = page.ele(
-                'x://h2[contains(translate(.,"ABCDEFGHIJKLMNOPQRSTUVWXYZ","abcdefghijklmnopqrstuvwxyz"),"english language requirements")]'
-                ' | //h3[contains(translate(.,"ABCDEFGHIJKLMNOPQRSTUVWXYZ","abcdefghijklmnopqrstuvwxyz"),"english language requirements")]'
-                ' | //h4[contains(translate(.,"ABCDEFGHIJKLMNOPQRSTUVWXYZ","abcdefghijklmnopqrstuvwxyz"),"english language requirements")]'
-            )
-
-            if title:
-                parts = []
-
-                # 2) 从下一个兄弟节点开始
-                sib = title.next()
-
-                # 3) 连续收集 <p>，直到遇到不是 p
-                while sib:
-                    if sib.tag != "p":
-                        break
-
-                    html = sib.html
-                    if html:
-                        parts.append(html)
-
-                    sib = sib.next()
+        with metrics.stage("language_require"):
+            try:
+                fields["language_require"] = snapshot.language_require()
+            except Exception as e:
+                err_list.append(f"language_require — {e}")
+                fields["language_require"] = ""
 
-                # 4) 拼成最终 HTML
-                if parts:
-                    language_require = "\n".join(parts)
+        return fields
 
+    def _course_struct_desc(self, fields: Dict[str, Any], major_url: str, metrics: "PageMetrics",
+                            err_list: List[str]) -> str:
+        course_struct_desc = fields["structure_html"]
 
+        # ---------- 链接课程抓 <h1> 文本作为课程名称 ---------- #
+        with metrics.stage("course_names"):
+            try:
+                if course_struct_desc:
+                    # 各方向重复的课程链接由课程名称缓存去重，这里不再另做一层
+                    course_struct_desc = self._resolve_course_names(course_struct_desc, major_url)
+            except Exception as e:
+                err_list.append(f"course_struct_desc — {e}")
 
+        # ---------- 最终合并 program 内容，无论前面是否抓到结构 ---------- #
+        try:
+            if fields["programme_html"]:
+                course_struct_desc = f"{fields['programme_html']}\n{course_struct_desc}".strip()
         except Exception as e:
-            err_list.append(f"language_require — {e}")
-            language_require = ""
+            err_list.append(f"programme merge — {e}")
+        return course_struct_desc
 
+    def _apply_url(self, get_page, major_url: str, fields: Dict[str, Any], metrics: "PageMetrics",
+                   err_list: List[str]) -> List[str]:
+        # get_page 只在确实需要浏览器时才调用（流水线模式下此时才租用标签页）
+        # ---------- 获取 apply_url（交互部分，仍需浏览器；静态页面到这里才打开标签页） ----------
+        with metrics.stage("apply_url"):
+            try:
+                if self.http_cache.offline:
+                    # 离线模式不做浏览器交互，沿用上次抓到的申请链接
+                    return self._previous_apply_url(major_url)
+                # 同一资格下结构和学费完全相同的方向共用申请流程，只点一次
+                return self.variant_cache.get_or_compute(
+                    "apply_url",
+                    variant_group_key(major_url, fields),
+                    lambda: self._collect_apply_urls(
+                        self._load_in_browser(get_page(), major_url, metrics, wait_fields=False), major_url, err_list
+                    ),
+                )
+            except Exception as e:
+                err_list.append(f"apply_url — {e}")
+                return []
+
+    def _finish_record(self, major_url: str, fields: Dict[str, Any], course_struct_desc: str,
+                       apply_url: List[str], metrics: "PageMetrics", err_list: List[str]):
         final_major_json = {
             "major_url-href": major_url,
-            "major_name": major_name,
-            "degree": degree,
-            "faculty_name": faculty_name,
-            "overview": overview,
-            "study_mode": study_mode,
-            "expected_duration": expected_duration,
-            "fees": fees,
-            "language_require": language_require,
+            "major_name": fields["major_name"],
+            "degree": fields["degree"],
+            "faculty_name": fields["faculty_name"],
+            "overview": fields["overview"],
+            "study_mode": fields["study_mode"],
+            "expected_duration": fields["expected_duration"],
+            "fees": fields["fees"],
+            "fees_detail": fields["fees_detail"],
+            "language_require": fields["language_require"],
             "course_struct_desc": course_struct_desc,
-            "academic_requirements": academic_requirements,
-            "entry_require_general_desc": entry_require_general_desc,
-            "entry_require": entry_require,
+            "academic_requirements": fields["academic_requirements"],
+            "entry_require_general_desc": fields["entry_require_general_desc"],
+            "entry_require": fields["entry_require"],
             "PTE": self.PTE,
             "TOEFL": self.TOEFL,
             "IELTS": self.IELTS,
@@ -689,8 +3109,18 @@ class UniversityOfOtagoPgSpider(BaseSpider):
             "apply_url": apply_url,
         }
 
-        # 存储数据到临时列表，供after_scrape处理
+        if metrics.error:
+            # 只为 apply_url 打开浏览器时加载失败，和整页加载失败一样交给队列重试
+            return ScrapeResult(
+                data={"major_url": major_url},
+                err_info={"url": major_url, "err_list": err_list}
+            )
+
+        # 结果立即追加写盘，供after_scrape迭代处理
         self.crawled_majors.append(final_major_json)
+        # 只有拿到专业名称的结果才作为增量基线
+        if fields["major_name"]:
+            self.remember_page_state(major_url, final_major_json)
 
         res = ScrapeResult(
             data=final_major_json,
@@ -701,12 +3131,524 @@ class UniversityOfOtagoPgSpider(BaseSpider):
         )
 
         return res
-        
+
+    def _static_snapshot(self, major_url: str) -> Optional["DetailPageSnapshot"]:
+        # 增量检查时已经下载过的页面直接复用，否则用连接池发一次 GET
+        with self._incremental_lock:
+            content = self._prefetched_html.pop(major_url, None)
+        if content is None:
+            try:
+                resp = self.http_session.get(major_url, timeout=20)
+                resp.raise_for_status()
+                content = resp.content
+            except Exception as e:
+                print(f"[静态] 请求失败，改用浏览器 {major_url}: {e}")
+                return None
+        try:
+            snapshot = DetailPageSnapshot(content.decode("utf-8", errors="replace"), major_url)
+        except ValueError:
+            return None
+        for name in self.static_required_selectors:
+            if snapshot.first(name) is None:
+                return None
+        return snapshot
+
+    def _load_in_browser(self, page: MixTab, major_url: str, metrics: "PageMetrics", wait_fields: bool) -> MixTab:
+        # 同一页面只加载一次；拿到自适应并发名额后才开始浏览器加载
+        if metrics.browser_loaded:
+            return page
+        if self.http_cache.offline:
+            metrics.error = True
+            raise RuntimeError("离线模式不打开浏览器，缓存中没有可用的静态页面")
+        with metrics.stage("concurrency_wait"):
+            self.concurrency.acquire()
+            metrics.holds_slot = True
+        try:
+            self._apply_resource_profile(page)
+            tracker = getattr(page, "_network_usage", None)
+            if tracker is not None:
+                # 丢掉上一个页面残留的事件（标签页是复用的）
+                tracker.take()
+            load_start = time.perf_counter()
+            with metrics.stage("page_load"):
+                page.get(major_url)
+                # 等待文档加载完成
+                page.wait.doc_loaded()
+                metrics.roundtrip(2)
+            self._record_resource_usage(page, time.perf_counter() - load_start)
+            # 等待标题和课程结构渲染完成（按条件等待，不再固定 sleep）
+            with metrics.stage("ready_wait"):
+                if not self.wait_ready(page, ["banner_title"], major_url):
+                    metrics.timeout = True
+                if wait_fields:
+                    self.wait_ready(page, ["programme_structure"], major_url)
+        except Exception:
+            metrics.error = True
+            raise
+        metrics.browser_loaded = True
+        if not wait_fields:
+            self._count_engine("apply_browser")
+        return page
+
+    def _apply_resource_profile(self, tab):
+        try:
+            self.resource_profile.apply(tab)
+        except Exception as e:
+            # 拦截设置失败不影响抓取，只是这个标签页照常加载全部资源
+            print(f"资源拦截设置失败: {e}")
+            tab._resource_profile_applied = True
+        if self.resource_stats and self.resource_profile.mode != "off" and not hasattr(tab, "_network_usage"):
+            try:
+                tab._network_usage = NetworkUsageTracker(tab)
+            except Exception as e:
+                print(f"资源统计设置失败: {e}")
+                tab._network_usage = None
+
+    def _record_resource_usage(self, page: MixTab, load_seconds: float):
+        # 事件由 CDP 推送过来，不需要额外的浏览器往返
+        tracker = getattr(page, "_network_usage", None)
+        if tracker is None:
+            return
+        finished, blocked = tracker.take()
+        self.resource_stats_collector.record(finished, blocked, load_seconds)
+
+    def _previous_apply_url(self, major_url: str) -> List[str]:
+        state = self.page_state.get(major_url)
+        record = state["record"] if state else None
+        return (record or {}).get("apply_url") or []
+
+    def _count_engine(self, engine: str):
+        with self._engine_lock:
+            self.engine_stats[engine] += 1
+
+    def _record_fee_layout(self, layout: str, scanned: bool):
+        with self._fee_stats_lock:
+            self.fee_layout_stats[layout] = self.fee_layout_stats.get(layout, 0) + 1
+            if scanned:
+                self.fee_fallback_scans += 1
+
+    def _resolve_course_names(self, structure_html: str, major_url: str) -> str:
+        # 在本地解析结构列表里的 <a>，不再把 HTML 发回浏览器执行 JS
+        links = extract_course_links(structure_html, major_url)
+        if not links:
+            return structure_html
+
+        # 先并发解析所有课程名称（缓存 + HTTP），再按原顺序拼接
+        course_titles = self.course_title_fetcher.resolve(links, self.course_title_cache)
+        final_courses = []
+        for item in links:
+            course_code = item["text"]
+            href = item["href"]
+
+            course_name = course_titles.get(href, "") if href else ""
+            if course_name:
+                final_courses.append(f"{course_code}: {course_name}")
+            else:
+                final_courses.append(course_code)
+        return ", ".join(final_courses)
+
+    # ==============================
+    # apply_url：Start application 弹窗
+    # ==============================
+    def _read_continue_href(self, page, visible_only: bool = True) -> str:
+        self._roundtrip(3 if visible_only else 2)
+        a_ele = page.ele("x:" + SELECTORS.xpath("continue_application"), timeout=0)
+        if a_ele and (not visible_only or a_ele.states.is_displayed):
+            return a_ele.attr('href') or ""
+        return ""
+
+    def _wait_continue_href(self, page, previous: str) -> str:
+        # 切换校区后 Continue 链接可能是同一个元素，需要等 href 变化
+        deadline = time.perf_counter() + self.ready_conditions["continue_application"][1]
+        href = self._read_continue_href(page)
+        while (not href or href == previous) and time.perf_counter() < deadline:
+            time.sleep(self.ready_poll_interval)
+            href = self._read_continue_href(page)
+        return href
+
+    def _open_apply_modal(self, page, major_url: str) -> bool:
+        btn = page.ele("x:" + SELECTORS.xpath("start_application"), timeout=0)
+        self._roundtrip()
+        if not btn:
+            return False
+        btn.click()
+        self._roundtrip()
+        return self.wait_ready(page, ["continue_application", "campus_options"], major_url, any_one=True)
+
+    def _collect_apply_urls(self, page, major_url: str, err_list: List[str]) -> List[str]:
+        apply_url = []  # 列表，用于存放多个链接
+
+        # 第一步：直接点击Start application然后获取Continue链接
+        try:
+            self._open_apply_modal(page, major_url)
+            href = self._read_continue_href(page, visible_only=False)
+            if href:
+                apply_url.append(href)
+        except Exception as e:
+            err_list.append(f"apply_url第一步 — {e}")
+
+        if apply_url:
+            return apply_url
+
+        # 第二步：同一个弹窗里依次选择各校区，收集所有链接（不再每个校区重新加载页面）
+        with self._apply_lock:
+            self.apply_fallback_urls.append(major_url)
+
+        previous = ""
+        for loc in self.apply_campuses:
+            try:
+                option = page.ele("x:" + SELECTORS.xpath("campus_option", campus=loc), timeout=0)
+                if not (option and option.states.is_displayed):
+                    # 选过校区后弹窗可能切换了视图，重新打开弹窗（不重新加载页面）
+                    self._open_apply_modal(page, major_url)
+                    option = page.ele("x:" + SELECTORS.xpath("campus_option", campus=loc), timeout=0)
+                if not option:
+                    continue
+
+                option.parent().click()
+                self._roundtrip(4)
+                href = self._wait_continue_href(page, previous)
+                if href and href not in apply_url:
+                    apply_url.append(href)  # 收集所有找到的链接，不break
+                previous = href or previous
+
+            except Exception as e:
+                err_list.append(f"apply_url{loc}地点 — {e}")
+                continue  # 继续尝试下一个地点
+
+        return apply_url
+
+    # ==============================
+    # 3）收尾：保存缓存并输出运行统计
+    # ==============================
+    def after_scrape(self, *args, **kwargs):
+        self.crawled_majors.flush()
+        self.course_title_cache.save()
+        self.course_title_fetcher.close()
+        self.http_session.close()
+        self.http_cache.close()
+        self.page_state.close()
+        self.tab_pool.close()
+        self.course_tab_pool.close()
+        job_counts = self.job_queue.counts()
+        unfinished = self.job_queue.unfinished(self._queued_urls)
+        self.job_queue.close()
+        self.metrics.close()
+        self.print_run_summary()
+        print(f"任务队列: {job_counts}")
+
+        result = None
+        parent_after_scrape = getattr(super(), "after_scrape", None)
+        if parent_after_scrape:
+            result = parent_after_scrape(*args, **kwargs)
+
+        # 队列里本轮任务全部结束后才打上完成标记（下次运行从头开始）；
+        # 还有失败待重试 / 未处理的任务时保留结果文件，下次接着写
+        if unfinished:
+            print(f"任务队列还有 {unfinished} 个未完成，结果文件保留用于续爬")
+        self._close_output(complete=not unfinished)
+        if self._shard_browser is not None:
+            try:
+                self._shard_browser.quit()
+            except Exception:
+                pass
+        return result
+
+    def _close_output(self, complete: bool):
+        if self.output_slot is None or not complete:
+            self.crawled_majors.close(complete=complete)
+            if self.output_slot is not None:
+                self.output_slot.close()
+            return
+        # 本轮跑完：其他槽位的进程都已退出时，把各 worker 文件合并进主文件再打完成标记；
+        # 还有进程在写时不合并，由最后结束的那个进程收尾
+        others = self.output_slot.lock_others()
+        if others is None:
+            print("其他进程还在写结果，由最后结束的进程合并输出")
+            self.crawled_majors.close()
+            self.output_slot.close()
+            return
+        worker_slots = sorted(set(others) | {self.output_slot.index})
+        if self.output_slot.index == 0:
+            primary = self.crawled_majors
+        else:
+            self.crawled_majors.close()
+            primary = self._result_sink(self._output_name)
+        primary.flush()
+        seen = {record.get("major_url-href", "") for record in primary}
+        merged = 0
+        for index in worker_slots:
+            if index == 0:
+                continue
+            path = self._result_path(f"{self._output_name}_worker{index}")
+            for record in read_results(path):
+                url = record.get("major_url-href", "")
+                if url not in seen:
+                    seen.add(url)
+                    primary.append(record)
+                    merged += 1
+            for leftover in (path, Path(f"{path}-wal"), Path(f"{path}-shm")):
+                if leftover.exists():
+                    leftover.unlink()
+        if merged:
+            print(f"合并其他进程的结果 {merged} 条 -> {primary.path}")
+        primary.close(complete=True)
+        self.output_slot.release(others)
+        self.output_slot.close()
+
+    # ==============================
+    # 流水线模式：各专业的下载、解析、课程名称、申请流程交错进行。
+    # DrissionPage 没有异步接口，浏览器和 requests 调用仍在线程池里阻塞执行，asyncio 只负责编排：
+    # 吞吐量受线程数（2 × pipeline_in_flight）限制，和调大 max_workers 同属线程并发，不是异步 CDP 驱动
+    # ==============================
+    def run_pipeline(self):
+        self.initialize()
+        # 专业列表来自 sitemap，用不到标签页
+        major_list = self.get_list_urls(None) or []
+        try:
+            asyncio.run(self._run_pipeline(major_list))
+        finally:
+            # 调度出错时也要关闭结果文件、队列和标签页池
+            self.after_scrape()
+
+    async def _run_pipeline(self, major_list: List[Dict[str, Any]]):
+        # DrissionPage / requests 都是阻塞接口，阻塞调用放到线程池；
+        # 每页同一时刻最多占两个线程（课程名称 + 申请流程），线程数按在途页数算，不会互相饿死
+        self._pipeline_executor = ThreadPoolExecutor(
+            max_workers=2 * self.pipeline_in_flight, thread_name_prefix="pipeline"
+        )
+        in_flight = asyncio.Semaphore(self.pipeline_in_flight)
+
+        async def one(major_info: Dict[str, Any]):
+            async with in_flight:
+                return await self._scrape_detail_page_async(major_info)
+
+        started = time.perf_counter()
+        try:
+            # 单个专业的异常（例如领取任务时 SQLite 忙）不影响其他专业，任务留在队列里下次重试
+            results = await asyncio.gather(*(one(major_info) for major_info in major_list), return_exceptions=True)
+        finally:
+            self._pipeline_executor.shutdown(wait=True)
+        elapsed = time.perf_counter() - started
+        errors = 0
+        for major_info, result in zip(major_list, results):
+            if isinstance(result, BaseException):
+                errors += 1
+                print(f"[流水线] 调度失败 {major_info.get('major_url-href', '')}: {result!r}")
+        done = sum(1 for result in results if result is not None and not isinstance(result, BaseException))
+        print(f"[流水线] {len(major_list)} 个专业，完成 {done} 个，出错 {errors} 个，耗时 {elapsed:.1f}s")
+
+    def _call_with_metrics(self, metrics: "PageMetrics", fn, *args):
+        # 线程池里的调用也要把浏览器往返次数记到对应页面上
+        self._metrics_local.current = metrics
+        try:
+            return fn(*args)
+        finally:
+            self._metrics_local.current = None
+
+    def _in_thread(self, metrics: Optional["PageMetrics"], fn, *args):
+        loop = asyncio.get_running_loop()
+        return loop.run_in_executor(self._pipeline_executor, self._call_with_metrics, metrics, fn, *args)
+
+    async def _scrape_detail_page_async(self, major_info: Dict[str, Any]):
+        major_url = major_info.get("major_url-href", "")
+        if not major_url:
+            return None
+        metrics = await self._in_thread(None, self._claim_page, major_url)
+        if metrics is None:
+            return None
+        tab = LazyTabLease(self.tab_pool)
+        broken = False
+        try:
+            result = await self._pipeline_page(major_url, metrics, tab)
+        except Exception as e:
+            broken = True
+            print(f"[流水线] 抓取失败 {major_url}: {e}")
+            await self._in_thread(None, self._finish_page, major_url, metrics, str(e))
+            return None
+        finally:
+            await self._in_thread(None, tab.release, broken)
+        await self._in_thread(None, self._finish_page, major_url, metrics, "页面加载失败" if metrics.error else None)
+        if result is not None and result.err_info.get("err_list"):
+            print(f"[流水线] {major_url}: {result.err_info['err_list']}")
+        return result
+
+    async def _pipeline_page(self, major_url: str, metrics: "PageMetrics", tab: LazyTabLease):
+        def run(fn, *args):
+            return self._in_thread(metrics, fn, *args)
+
+        err_list: List[str] = []
+        with metrics.stage("incremental_check"):
+            reused, result = await run(self._reuse_unchanged, major_url)
+        if reused:
+            return result
+
+        snapshot = None
+        if self.static_first:
+            with metrics.stage("static_fetch"):
+                snapshot = await run(self._static_snapshot, major_url)
+        if snapshot is None:
+            page = await run(tab.get)
+            snapshot, result = await run(self._browser_snapshot, page, major_url, metrics)
+            if snapshot is None:
+                return result
+        else:
+            metrics.engine = "static"
+        self._count_engine(metrics.engine)
+
+        fields = await run(self._extract_fields, snapshot, major_url, metrics, err_list)
+        if fields is None:
+            return None
+        # 课程名称（HTTP）和申请流程（浏览器）互不依赖，同时进行；
+        # 本页等待浏览器时，其他专业的下载和解析照常推进
+        course_struct_desc, apply_url = await asyncio.gather(
+            run(self._course_struct_desc, fields, major_url, metrics, err_list),
+            run(self._apply_url, tab.get, major_url, fields, metrics, err_list),
+        )
+        return await run(self._finish_record, major_url, fields, course_struct_desc, apply_url, metrics, err_list)
+
+    # ==============================
+    # 多进程分片：主进程初始化一次，各分片独立抓取，最后按 URL 排序合并
+    # ==============================
+    @classmethod
+    def run_sharded(cls, shard_count: int, pipeline: bool = False):
+        spider = cls()
+        spider.initialize()
+        # 主进程只在初始化时可能用到浏览器，关掉辅助标签页，不让它在整个分片运行期间一直开着
+        spider.tab_pool.close()
+        shared_init_data = {key: getattr(spider, key) for key in spider.init_data_fields}
+
+        context = multiprocessing.get_context("spawn")
+        processes = [
+            context.Process(
+                target=run_shard,
+                args=(cls, (index, shard_count), shared_init_data, pipeline),
+                name=f"shard-{index}",
+            )
+            for index in range(shard_count)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+            if process.exitcode != 0:
+                print(f"[分片] {process.name} 异常退出，exitcode={process.exitcode}")
+
+        # 合并：同一 URL 只保留一条，按 URL 排序保证结果稳定
+        merged: Dict[str, Dict[str, Any]] = {}
+        for index in range(shard_count):
+            shard_path = spider._result_path(f'{spider.school_name}_{spider.major_level}_shard{index}of{shard_count}')
+            for record in read_results(shard_path):
+                merged.setdefault(record.get("major_url-href", ""), record)
+        for url in sorted(merged):
+            if url not in spider.crawled_majors.done_urls:
+                spider.crawled_majors.append(merged[url])
+        print(f"[分片] {shard_count} 个分片合并完成，共 {len(spider.crawled_majors)} 条")
+
+        spider.after_scrape()
+        return spider
+
+    def print_run_summary(self):
+        print("====== 运行统计 ======")
+        print(f"结果条数: {len(self.crawled_majors)}（{self.crawled_majors.path}）")
+        output_stats = getattr(self.crawled_majors, "stats", None)
+        if output_stats:
+            print(
+                f"去重输出: 原始 {output_stats['raw_bytes'] / 1024:.0f} KB -> 存储 {output_stats['stored_bytes'] / 1024:.0f} KB，"
+                f"blob {output_stats['blobs']} 个，复用 {output_stats['blob_reuses']} 次"
+            )
+        if self.prefilter_decisions:
+            excluded = sum(1 for d in self.prefilter_decisions if not d["keep"])
+            print(f"预筛: 检查 {len(self.prefilter_decisions)} 个，排除 {excluded} 个（未进入浏览器）")
+        cache_stats = self.course_title_cache.stats()
+        print(
+            f"课程名称缓存: 命中 {cache_stats['hits']} / 未命中 {cache_stats['misses']}"
+            f"（命中率 {cache_stats['hit_rate']:.1%}，缓存条目 {cache_stats['entries']}）"
+        )
+        print(
+            f"课程名称抓取: HTTP {self.course_title_fetcher.http_titles}"
+            f" / 浏览器兜底 {self.course_title_fetcher.browser_titles}"
+        )
+        pool_stats = self.tab_pool.stats
+        print(
+            f"辅助标签页池: 租借 {pool_stats['leases']} 次，新建 {pool_stats['created']} 个，回收 {pool_stats['recycled']} 个"
+        )
+        fallback_stats = self.course_tab_pool.stats
+        print(
+            f"课程名称兜底标签页池: 租借 {fallback_stats['leases']} 次，新建 {fallback_stats['created']} 个，回收 {fallback_stats['recycled']} 个"
+        )
+        print(
+            f"就绪等待: {self.ready_wait_stats['waits']} 次，累计 {self.ready_wait_stats['seconds']:.1f}s，"
+            f"超时条件 {self.ready_wait_stats['timeouts']} 个"
+        )
+        if self.incremental:
+            stats = self.incremental_stats
+            print(
+                f"增量抓取: 未变化复用 {stats['unchanged']} / 已变化 {stats['changed']} / 新页面 {stats['new']}"
+                f" / 检查失败 {stats['check_failed']}"
+            )
+        fallback_count = len(self.apply_fallback_urls)
+        # 旧流程每个兜底专业要为每个校区重新加载一次页面
+        print(
+            f"apply_url 校区兜底: {fallback_count} 个专业，"
+            f"节省页面加载 {fallback_count * len(self.apply_campuses)} 次"
+        )
+        for url in self.apply_fallback_urls:
+            print(f"  - {url}")
+        engine = self.engine_stats
+        print(
+            f"抓取方式: 静态 HTTP {engine['static']} / 浏览器 {engine['browser']}"
+            f"（静态页面为 apply_url 打开浏览器 {engine['apply_browser']} 次）"
+        )
+        http_stats = self.http_cache.stats
+        print(
+            f"HTTP 缓存（{self.http_cache.mode}）: 命中 {http_stats['hits']} / 重新验证 {http_stats['revalidated']}"
+            f" / 网络请求 {http_stats['misses']}，写入 {http_stats['stored']}，淘汰 {http_stats['evicted']}"
+        )
+        for line in self.resource_stats_collector.report_lines():
+            print(line)
+        if self.fee_layout_stats:
+            layouts = "，".join(f"{k} {v}" for k, v in sorted(self.fee_layout_stats.items()))
+            print(f"学费版式: {layouts}；全文 NZ$ 扫描执行 {self.fee_fallback_scans} 次")
+        print("选择器命中率:")
+        for line in SELECTORS.report_lines():
+            print(f"  {line}")
+        for kind, stats in self.variant_cache.stats.items():
+            print(f"方向共用片段 {kind}: 复用 {stats['reused']} 次 / 实际提取 {stats['computed']} 次")
+        print(
+            f"自适应并发: 当前 {self.concurrency.limit}，平均 {self.concurrency.average_limit():.1f}"
+            f"（范围 {self.concurrency.minimum}-{self.concurrency.ceiling}）"
+        )
+        for offset, limit, reason in self.concurrency.history:
+            print(f"  +{offset:>7.0f}s  {limit:>3}  {reason}")
+        metric_lines = self.metrics.report_lines()
+        if metric_lines:
+            print(f"各阶段耗时（秒，明细见 {self.metrics.path}）:")
+            for line in metric_lines:
+                print(f"  {line}")
 
 
 
+def run_shard(spider_cls, shard: tuple, shared_init_data: Dict[str, str], pipeline: bool = False):
+    # 子进程入口（spawn 方式启动，需要是模块级函数）
+    spider = spider_cls(shard=shard, shared_init_data=shared_init_data)
+    if pipeline:
+        spider.run_pipeline()
+    else:
+        spider.run()
 
 
 if __name__ == "__main__":
-    spider = UniversityOfOtagoPgSpider()
-    spider.run()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--shards", type=int, default=1, help="多进程分片数，>1 时每个分片一个进程")
+    parser.add_argument("--pipeline", action="store_true", help="线程池流水线模式抓取详情页（asyncio 编排）")
+    args = parser.parse_args()
+
+    if args.shards > 1:
+        UniversityOfOtagoPgSpider.run_sharded(args.shards, pipeline=args.pipeline)
+    else:
+        spider = UniversityOfOtagoPgSpider()
+        if args.pipeline:
+            spider.run_pipeline()
+        else:
+            spider.run()
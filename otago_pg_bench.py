@@ -0,0 +1,397 @@
+"""
+Otago PG 提取逻辑的离线回放 / 基准测试
+
+录制：把详情页、课程子页面、申请日期页、语言要求页保存成 HTML 夹具
+    python otago_pg_bench.py record --urls urls.txt
+    python otago_pg_bench.py record --from-output output/University_of_Otago_pg.jsonl
+    python otago_pg_bench.py record --from-output output/University_of_Otago_pg.sqlite3
+
+回放：用本地替身代替 MixTab / ChromiumPage 跑 scrape_detail_page，
+输出 pages/sec、各阶段耗时，并和 golden JSON 对比
+    python otago_pg_bench.py replay
+    python otago_pg_bench.py replay --update-golden
+    python otago_pg_bench.py replay --pipeline --repeat 5
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, Any, Optional, List
+
+from lxml import etree
+
+from otago_pg import (
+    DetailPageSnapshot,
+    UniversityOfOtagoPgSpider,
+    build_http_session,
+    element_text,
+    extract_course_links,
+    outer_html,
+    read_results,
+)
+
+DEFAULT_FIXTURES = Path(__file__).parent / 'bench_fixtures'
+
+
+# ==============================
+# 夹具存储：index.json 记录 URL -> 文件
+# ==============================
+class FixtureStore:
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self.pages_dir = self.root / 'pages'
+        self.index_path = self.root / 'index.json'
+        self.golden_path = self.root / 'golden.json'
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                self.index: Dict[str, Dict[str, str]] = json.load(f)
+        except FileNotFoundError:
+            self.index = {}
+
+    def add(self, url: str, kind: str, content: bytes):
+        name = hashlib.sha1(url.encode("utf-8")).hexdigest() + ".html"
+        self.pages_dir.mkdir(parents=True, exist_ok=True)
+        (self.pages_dir / name).write_bytes(content)
+        self.index[url] = {"file": name, "kind": kind}
+
+    def has(self, url: str) -> bool:
+        return url in self.index
+
+    def content(self, url: str) -> Optional[bytes]:
+        entry = self.index.get(url)
+        if not entry:
+            return None
+        return (self.pages_dir / entry["file"]).read_bytes()
+
+    def urls(self, kind: str) -> List[str]:
+        return sorted(url for url, entry in self.index.items() if entry["kind"] == kind)
+
+    def save(self):
+        self.root.mkdir(parents=True, exist_ok=True)
+        with open(self.index_path, "w", encoding="utf-8") as f:
+            json.dump(self.index, f, ensure_ascii=False, indent=2, sort_keys=True)
+
+    def load_golden(self) -> Dict[str, Any]:
+        try:
+            with open(self.golden_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def save_golden(self, records: Dict[str, Any]):
+        with open(self.golden_path, "w", encoding="utf-8") as f:
+            json.dump(records, f, ensure_ascii=False, indent=2, sort_keys=True)
+
+
+# ==============================
+# MixTab / ChromiumPage 的本地替身：在夹具 HTML 上执行定位
+# ==============================
+def to_xpath(locator: str) -> str:
+    if locator.startswith("x:"):
+        return locator[2:]
+    if locator.startswith("css:#"):
+        return f'//*[@id="{locator[5:]}"]'
+    if locator.startswith("tag:"):
+        return f".//{locator[4:]}"
+    return locator
+
+
+class NoneElement:
+    def __bool__(self):
+        return False
+
+
+class ReplayStates:
+    is_displayed = True
+
+
+class ReplayElement:
+    states = ReplayStates()
+
+    def __init__(self, ele):
+        self._ele = ele
+
+    @property
+    def text(self) -> str:
+        return element_text(self._ele)
+
+    @property
+    def html(self) -> str:
+        return outer_html(self._ele)
+
+    @property
+    def tag(self) -> str:
+        return self._ele.tag
+
+    def attr(self, name: str) -> Optional[str]:
+        return self._ele.get(name)
+
+    def parent(self):
+        parent = self._ele.getparent()
+        return ReplayElement(parent) if parent is not None else NoneElement()
+
+    def ele(self, locator: str, timeout: Optional[float] = None):
+        found = self._ele.xpath(to_xpath(locator))
+        return ReplayElement(found[0]) if found else NoneElement()
+
+    def click(self):
+        # 静态夹具里没有交互，点击不产生变化
+        return False
+
+
+class ReplayWait:
+    def doc_loaded(self, *args, **kwargs):
+        return True
+
+    def __call__(self, *args, **kwargs):
+        return None
+
+
+class ReplayTab:
+    def __init__(self, store: FixtureStore):
+        self._store = store
+        self._html = ""
+        self._tree = None
+        self.url = ""
+        self.wait = ReplayWait()
+
+    def get(self, url: str, timeout: Optional[float] = None, **kwargs) -> bool:
+        content = self._store.content(url)
+        self.url = url
+        self._html = content.decode("utf-8", errors="replace") if content else ""
+        self._tree = etree.HTML(self._html) if self._html else None
+        return content is not None
+
+    @property
+    def html(self) -> str:
+        return self._html
+
+    def ele(self, locator: str, timeout: Optional[float] = None):
+        found = self._tree.xpath(to_xpath(locator)) if self._tree is not None else []
+        return ReplayElement(found[0]) if found else NoneElement()
+
+    def eles(self, locator: str, timeout: Optional[float] = None):
+        found = self._tree.xpath(to_xpath(locator)) if self._tree is not None else []
+        return [ReplayElement(e) for e in found]
+
+    def run_js(self, script: str, *args):
+        # 回放里不执行 JS
+        return None
+
+    def close(self):
+        pass
+
+
+class ReplayBrowser:
+    process_id = None
+
+    def __init__(self, store: FixtureStore):
+        self._store = store
+
+    def new_tab(self):
+        return ReplayTab(self._store)
+
+
+class FixtureResponse:
+    def __init__(self, url: str, content: Optional[bytes]):
+        self.url = url
+        self.status_code = 200 if content is not None else 404
+        self.content = content or b""
+        self.headers: Dict[str, str] = {}
+
+    @property
+    def text(self) -> str:
+        return self.content.decode("utf-8", errors="replace")
+
+    def raise_for_status(self):
+        if self.status_code != 200:
+            raise IOError(f"夹具中没有 {self.url}")
+
+
+class FixtureSession:
+    def __init__(self, store: FixtureStore):
+        self._store = store
+
+    def get(self, url: str, headers: Optional[Dict[str, str]] = None, timeout: Optional[float] = None, **kwargs):
+        return FixtureResponse(url, self._store.content(url))
+
+    def close(self):
+        pass
+
+
+class ReplaySpider(UniversityOfOtagoPgSpider):
+    incremental = False
+    prefilter_title_probe = False
+    # 替身标签页没有网络层，不设置资源拦截
+    resource_blocking = "off"
+
+    def __init__(self, store: FixtureStore, workdir: Path):
+        self._store = store
+        # 缓存和输出都放到临时目录，避免影响正式数据
+        self.cache_dir = workdir / 'cache'
+        self.output_dir = workdir / 'output'
+        super().__init__()
+        self.http_session = FixtureSession(store)
+        self.course_title_fetcher.session = self.http_session
+        # 静态夹具要么有这个元素要么没有，不需要等待
+        self.ready_conditions = {
+            name: (locator, 0, visible) for name, (locator, _, visible) in self.ready_conditions.items()
+        }
+
+    def _get_browser(self):
+        return ReplayBrowser(self._store)
+
+
+# ==============================
+# 录制
+# ==============================
+def course_links(html: bytes, base_url: str) -> List[str]:
+    try:
+        structure = DetailPageSnapshot(html.decode("utf-8", errors="replace"), base_url).structure_list()
+    except (ValueError, AttributeError):
+        return []
+    return [link["href"] for link in extract_course_links(structure, base_url) if link["href"]]
+
+
+def record(args):
+    store = FixtureStore(args.fixtures)
+    session = build_http_session(pool_size=4)
+
+    urls: List[str] = []
+    if args.urls:
+        with open(args.urls, "r", encoding="utf-8") as f:
+            urls.extend(line.strip() for line in f if line.strip())
+    if args.from_output:
+        urls.extend(record.get("major_url-href", "") for record in read_results(args.from_output))
+    urls = [u for u in dict.fromkeys(urls) if u]
+
+    def fetch(url: str, kind: str) -> Optional[bytes]:
+        if store.has(url) and not args.refresh:
+            return store.content(url)
+        try:
+            resp = session.get(url, timeout=30)
+            resp.raise_for_status()
+        except Exception as e:
+            print(f"录制失败 {url}: {e}")
+            return None
+        store.add(url, kind, resp.content)
+        print(f"已录制 [{kind}] {url}")
+        return resp.content
+
+    fetch(UniversityOfOtagoPgSpider.key_dates_url, "shared")
+    fetch(UniversityOfOtagoPgSpider.language_requirements_url, "shared")
+    for url in urls:
+        content = fetch(url, "detail")
+        for link in course_links(content, url):
+            fetch(link, "course")
+
+    store.save()
+    print(f"录制完成: 详情页 {len(store.urls('detail'))}，课程页 {len(store.urls('course'))} -> {store.root}")
+
+
+# ==============================
+# 回放 + 对比
+# ==============================
+def diff_records(golden: Dict[str, Any], current: Dict[str, Any]) -> List[str]:
+    diffs = []
+    for url in sorted(set(golden) | set(current)):
+        if url not in current:
+            diffs.append(f"{url}: 本次没有结果")
+            continue
+        if url not in golden:
+            diffs.append(f"{url}: golden 中没有")
+            continue
+        expected, actual = golden[url] or {}, current[url] or {}
+        for field in sorted(set(expected) | set(actual)):
+            if expected.get(field) != actual.get(field):
+                diffs.append(
+                    f"{url} [{field}]: {str(expected.get(field))[:80]!r} -> {str(actual.get(field))[:80]!r}"
+                )
+    return diffs
+
+
+def replay(args) -> int:
+    store = FixtureStore(args.fixtures)
+    urls = store.urls("detail")
+    if not urls:
+        print(f"没有可回放的详情页，请先 record: {store.root}")
+        return 1
+
+    workdir = Path(tempfile.mkdtemp(prefix="otago_bench_"))
+    spider = ReplaySpider(store, workdir)
+    spider.initialize()
+
+    results: Dict[str, Any] = {}
+    start = time.perf_counter()
+    if args.pipeline:
+        major_list = [{"major_url-href": url} for _ in range(args.repeat) for url in urls]
+        asyncio.run(spider._run_pipeline(major_list))
+        for record in spider.crawled_majors:
+            results[record.get("major_url-href", "")] = record
+    else:
+        for _ in range(args.repeat):
+            for url in urls:
+                res = spider.scrape_detail_page(ReplayTab(store), {"major_url-href": url})
+                results[url] = res.data if res else None
+    elapsed = time.perf_counter() - start
+    pages = len(urls) * args.repeat
+
+    print("====== 回放结果 ======")
+    print(f"页面 {pages} 个，耗时 {elapsed:.2f}s，{pages / elapsed if elapsed else 0:.1f} pages/sec")
+    for line in spider.metrics.report_lines():
+        print(f"  {line}")
+    spider.metrics.close()
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2, sort_keys=True)
+
+    if args.update_golden:
+        store.save_golden(results)
+        print(f"已更新 golden: {store.golden_path}")
+        return 0
+
+    golden = store.load_golden()
+    if not golden:
+        print("没有 golden，跳过对比（可用 --update-golden 生成）")
+        return 0
+    diffs = diff_records(golden, results)
+    if diffs:
+        print(f"与 golden 不一致 {len(diffs)} 处:")
+        for line in diffs[:args.max_diffs]:
+            print(f"  {line}")
+        return 2
+    print("与 golden 一致")
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Otago PG 提取离线回放 / 基准测试")
+    parser.add_argument("--fixtures", type=Path, default=DEFAULT_FIXTURES, help="夹具目录")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    rec = sub.add_parser("record", help="录制页面夹具")
+    rec.add_argument("--urls", help="详情页 URL 列表文件，每行一个")
+    rec.add_argument("--from-output", help="从已有结果（JSONL / 去重 SQLite）中读取详情页 URL")
+    rec.add_argument("--refresh", action="store_true", help="已录制的页面也重新下载")
+
+    rep = sub.add_parser("replay", help="回放夹具并统计性能")
+    rep.add_argument("--repeat", type=int, default=1, help="重复回放次数")
+    rep.add_argument("--out", help="把回放结果写到 JSON 文件")
+    rep.add_argument("--update-golden", action="store_true", help="用本次结果覆盖 golden")
+    rep.add_argument("--max-diffs", type=int, default=50, help="最多打印多少条差异")
+    rep.add_argument("--pipeline", action="store_true", help="用线程池流水线模式回放")
+
+    args = parser.parse_args(argv)
+    if args.command == "record":
+        record(args)
+        return 0
+    return replay(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,7 @@
+import sys
+from pathlib import Path
+
+# otago_pg.py 在仓库根目录，不是安装包。
+# 它依赖爬虫框架的 core / utils 包（不在本仓库里）：导入不到时各测试模块整体跳过，
+# 需要在装好框架的环境里运行（或把框架目录加到 PYTHONPATH）
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
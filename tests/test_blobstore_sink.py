@@ -0,0 +1,47 @@
+import sqlite3
+
+import pytest
+
+otago_pg = pytest.importorskip("otago_pg")
+
+
+def record(url, **extra):
+    return {"major_url-href": url, **extra}
+
+
+def urls(records):
+    return [r["major_url-href"] for r in records]
+
+
+def test_blobstore_records_are_committed_on_append(tmp_path):
+    path = tmp_path / "out.sqlite3"
+    sink = otago_pg.BlobStoreResultSink(path)
+    sink.append(record("u1", detail="x" * 300))
+    sink.append(record("u2", detail="x" * 300))
+
+    # 不调用 flush/close：另一个连接也必须能看到这两条（任务随后就会在队列里标记完成）
+    conn = sqlite3.connect(str(path))
+    try:
+        assert conn.execute("SELECT COUNT(*) FROM records").fetchone()[0] == 2
+    finally:
+        conn.close()
+    sink.close()
+
+
+def test_blobstore_resume_round_trips_records(tmp_path):
+    path = tmp_path / "out.sqlite3"
+    shared = "Admission requirements " * 20
+    sink = otago_pg.BlobStoreResultSink(path)
+    sink.append(record("u1", admission=shared, fees=""))
+    sink.append(record("u2", admission=shared, fees="NZ$45,000 annual"))
+    sink.close()
+
+    sink = otago_pg.BlobStoreResultSink(path)
+    assert sink.done_urls == {"u1", "u2"}
+    sink.append(record("u3", admission=shared))
+    sink.close(complete=True)
+
+    records = list(otago_pg.read_results(path))
+    assert urls(records) == ["u1", "u2", "u3"]
+    assert records[1] == record("u2", admission=shared, fees="NZ$45,000 annual")
+    assert list(records[1]) == ["major_url-href", "admission", "fees"]
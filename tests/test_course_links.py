@@ -0,0 +1,24 @@
+import pytest
+
+otago_pg = pytest.importorskip("otago_pg")
+
+
+def test_extract_course_links_keeps_every_occurrence():
+    html = (
+        '<ol><li><a href="/courses/papers/ABCD401" data-uw-original-href="/courses/papers/ABCD401?y=2026">'
+        "ABCD 401</a></li>"
+        '<li><a href="https://www.otago.ac.nz/courses/papers/EFGH402">EFGH  402</a></li>'
+        '<li><a href="/courses/papers/ABCD401" data-uw-original-href="/courses/papers/ABCD401?y=2026">'
+        "ABCD 401</a></li></ol>"
+    )
+    links = otago_pg.extract_course_links(html, "https://www.otago.ac.nz/study/programme")
+
+    assert links == [
+        {"text": "ABCD 401", "href": "https://www.otago.ac.nz/courses/papers/ABCD401?y=2026"},
+        {"text": "EFGH 402", "href": "https://www.otago.ac.nz/courses/papers/EFGH402"},
+        {"text": "ABCD 401", "href": "https://www.otago.ac.nz/courses/papers/ABCD401?y=2026"},
+    ]
+
+
+def test_extract_course_links_empty_fragment():
+    assert otago_pg.extract_course_links("") == []
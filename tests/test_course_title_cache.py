@@ -0,0 +1,37 @@
+import json
+import threading
+
+import pytest
+
+otago_pg = pytest.importorskip("otago_pg")
+
+
+def test_concurrent_saves_leave_valid_cache_file(tmp_path, capsys):
+    path = tmp_path / "course_titles.json"
+    cache = otago_pg.CourseTitleCache(path, ttl=3600, max_entries=1000, save_every=1)
+    barrier = threading.Barrier(8)
+
+    def work(i):
+        barrier.wait()
+        cache.get_or_load(f"https://a/{i}", f"C{i}", lambda url: f"title {url}")
+        cache.save()
+
+    threads = [threading.Thread(target=work, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert "保存失败" not in capsys.readouterr().out
+    assert len(json.loads(path.read_text(encoding="utf-8"))["entries"]) == 8
+    assert not list(tmp_path.glob("*.tmp"))
+    # 新实例能读回全部条目
+    reloaded = otago_pg.CourseTitleCache(path, ttl=3600, max_entries=1000)
+    assert reloaded.get_or_load("https://a/3", "C3", lambda url: "") == "title https://a/3"
+
+
+def test_cache_hit_skips_loader(tmp_path):
+    cache = otago_pg.CourseTitleCache(tmp_path / "t.json", ttl=3600, max_entries=10)
+    assert cache.get_or_load("https://a/1", "C1", lambda url: "Title") == "Title"
+    assert cache.get_or_load("https://a/1", "C1", lambda url: pytest.fail("loader called")) == "Title"
+    assert cache.stats()["hits"] == 1
@@ -0,0 +1,62 @@
+import pytest
+
+otago_pg = pytest.importorskip("otago_pg")
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("NZ$45,000 annual", {"amount": 45000.0, "currency": "NZD", "period": "annual", "year": 2026, "tbc": False}),
+        (
+            "Total programme fee US$10,500.50 (2027)",
+            {"amount": 10500.5, "currency": "USD", "period": "total", "year": 2027, "tbc": False},
+        ),
+        ("To be confirmed", {"amount": None, "currency": "", "period": "", "year": 2026, "tbc": True}),
+        ("", {"amount": None, "currency": "", "period": "", "year": 2026, "tbc": False}),
+    ],
+)
+def test_parse_fee_text(text, expected):
+    info = otago_pg.parse_fee_text(text, 2026)
+    assert info["text"] == text
+    assert {key: info[key] for key in expected} == expected
+
+
+def test_fee_info_info_bar_layout():
+    html = "<html><body><div><span>International fee 2026: NZ$45,000</span></div></body></html>"
+    info = otago_pg.DetailPageSnapshot(html).fee_info(2026)
+
+    assert info["text"] == "NZ$45,000 annual"
+    assert info["amount"] == 45000.0
+    assert info["layout"] == "info_bar"
+    assert not info["fallback_scanned"]
+
+
+def test_fee_info_details_item_layout():
+    html = (
+        '<html><body><div class="programme-details__fees-item"><p>International 2026</p>'
+        "<h3>NZ$38,950</h3></div></body></html>"
+    )
+    info = otago_pg.DetailPageSnapshot(html).fee_info(2026)
+
+    assert info["text"] == "NZ$38,950 annual"
+    assert info["layout"] == "details_item"
+
+
+def test_fee_info_to_be_confirmed_falls_back_to_nzd_scan():
+    html = (
+        "<html><body><span>International fee 2026: To be confirmed</span>"
+        "<p>International students: NZ$41,000 per year</p></body></html>"
+    )
+    info = otago_pg.DetailPageSnapshot(html).fee_info(2026)
+
+    assert info["amount"] == 41000.0
+    assert info["layout"] == "nzd_text"
+    assert info["fallback_scanned"]
+
+
+def test_fee_info_without_fees():
+    info = otago_pg.DetailPageSnapshot("<html><body><p>Overview</p></body></html>").fee_info(2026)
+
+    assert info["text"] == ""
+    assert info["amount"] is None
+    assert info["layout"] == "none"
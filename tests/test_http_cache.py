@@ -0,0 +1,80 @@
+import hashlib
+import time
+from email.utils import formatdate
+
+import pytest
+
+otago_pg = pytest.importorskip("otago_pg")
+
+
+@pytest.fixture
+def cache(tmp_path):
+    c = otago_pg.HttpResponseCache(tmp_path / "http", default_ttl=600, max_bytes=10, evict_every=1000)
+    yield c
+    c.close()
+
+
+@pytest.mark.parametrize(
+    "headers, expected",
+    [
+        ({"Cache-Control": "no-store"}, None),
+        ({"Cache-Control": "no-cache"}, 0.0),
+        ({"Cache-Control": "public, max-age=120"}, 120.0),
+        ({"Expires": formatdate(time.time() - 3600, usegmt=True)}, 0.0),
+        ({"Expires": "not a date"}, 0.0),
+        ({}, 600),
+    ],
+)
+def test_freshness(cache, headers, expected):
+    assert cache.freshness(headers) == expected
+
+
+def test_freshness_uses_future_expires(cache):
+    ttl = cache.freshness({"Expires": formatdate(time.time() + 3600, usegmt=True)})
+    assert 3500 < ttl <= 3600
+
+
+def test_ttl_override_ignores_response_headers(tmp_path):
+    cache = otago_pg.HttpResponseCache(tmp_path / "http", ttl_override=30)
+    try:
+        assert cache.freshness({"Cache-Control": "no-store"}) == 30
+    finally:
+        cache.close()
+
+
+def test_no_store_response_is_not_cached(cache):
+    assert not cache.put("https://a/1", 200, {"Cache-Control": "no-store"}, b"body")
+    assert cache.get("https://a/1") is None
+
+
+def test_evict_removes_least_recently_used_until_under_limit(cache):
+    cache.put("https://a/1", 200, {}, b"aaaaaa")
+    cache.put("https://a/2", 200, {}, b"bbbbbb")
+    # 1 最近用过，应该留下；2 被淘汰
+    with cache._lock:
+        cache._conn.execute("UPDATE responses SET last_used = 1 WHERE url = ?", ("https://a/2",))
+    cache.touch("https://a/1")
+
+    cache.evict()
+
+    assert cache.get("https://a/1")["content"] == b"aaaaaa"
+    assert cache.get("https://a/2") is None
+    assert not cache._blob_path(hashlib.sha256(b"bbbbbb").hexdigest()).exists()
+    assert cache.stats["evicted"] == 1
+
+
+def test_evict_keeps_blobs_still_referenced(tmp_path):
+    cache = otago_pg.HttpResponseCache(tmp_path / "http", max_age=60)
+    try:
+        cache.put("https://a/old", 200, {}, b"same")
+        cache.put("https://a/new", 200, {}, b"same")
+        with cache._lock:
+            cache._conn.execute("UPDATE responses SET stored_at = 0 WHERE url = ?", ("https://a/old",))
+
+        cache.evict()
+
+        assert cache.get("https://a/old") is None
+        # 同一内容还被另一个 URL 引用，文件不能删
+        assert cache.get("https://a/new")["content"] == b"same"
+    finally:
+        cache.close()
@@ -0,0 +1,90 @@
+import os
+import socket
+import subprocess
+import sys
+
+import pytest
+
+otago_pg = pytest.importorskip("otago_pg")
+
+
+@pytest.fixture
+def queue(tmp_path):
+    q = otago_pg.CrawlJobQueue(tmp_path / "jobs.sqlite3", max_attempts=2, backoff_base=300)
+    yield q
+    q.close()
+
+
+def seed(queue, *urls):
+    queue.seed([{"major_url-href": url} for url in urls], {})
+
+
+def pending_urls(queue):
+    return [job["major_url-href"] for job in queue.pending_jobs()]
+
+
+def states(queue):
+    with queue._lock:
+        return dict(queue._conn.execute("SELECT url, state FROM jobs").fetchall())
+
+
+def test_claim_is_exclusive(queue):
+    seed(queue, "u1", "u2")
+    assert queue.claim("u1", "worker-a")
+    assert not queue.claim("u1", "worker-b")
+    assert pending_urls(queue) == ["u2"]
+    # 不在队列里的 URL 不受队列管理
+    assert queue.claim("unknown", "worker-a")
+
+
+def test_failed_job_waits_for_backoff_and_respects_max_attempts(tmp_path):
+    queue = otago_pg.CrawlJobQueue(tmp_path / "jobs.sqlite3", max_attempts=2, backoff_base=0)
+    try:
+        seed(queue, "u1")
+        assert queue.claim("u1", "w")
+        queue.fail("u1", "timeout", 1.0)
+        assert pending_urls(queue) == ["u1"]
+        assert queue.claim("u1", "w")
+        queue.fail("u1", "timeout", 1.0)
+        # 用完重试次数后不再出现
+        assert pending_urls(queue) == []
+        assert queue.unfinished() == 0
+    finally:
+        queue.close()
+
+
+def test_begin_run_continues_while_jobs_are_unfinished(queue):
+    seed(queue, "u1", "u2")
+    assert queue.claim("u1", "w")
+    queue.complete("u1", 1.0)
+    assert queue.claim("u2", "w")
+    queue.fail("u2", "boom", 1.0)
+
+    # 失败但还能重试（即使还在退避期内）也算本轮没跑完
+    assert queue.unfinished() == 1
+    assert queue.unfinished(["u1"]) == 0
+    assert not queue.begin_run()
+    assert states(queue) == {"u1": "done", "u2": "failed"}
+
+
+def test_begin_run_starts_new_round_when_everything_finished(queue):
+    seed(queue, "u1", "u2")
+    for url in ("u1", "u2"):
+        assert queue.claim(url, "w")
+        queue.complete(url, 1.0)
+
+    assert queue.begin_run()
+    assert states(queue) == {"u1": "pending", "u2": "pending"}
+
+
+def test_begin_run_reclaims_jobs_of_dead_processes(queue):
+    seed(queue, "u1", "u2")
+    dead = subprocess.Popen([sys.executable, "-c", "pass"])
+    dead.wait()
+    host = socket.gethostname()
+    assert queue.claim("u1", f"{host}:{dead.pid}:1")
+    assert queue.claim("u2", f"{host}:{os.getpid()}:1")
+
+    assert not queue.begin_run()
+    assert states(queue) == {"u1": "pending", "u2": "in_progress"}
+    assert pending_urls(queue) == ["u1"]
@@ -0,0 +1,76 @@
+import gzip
+import shutil
+
+import pytest
+
+otago_pg = pytest.importorskip("otago_pg")
+
+
+def record(url, **extra):
+    return {"major_url-href": url, **extra}
+
+
+def urls(records):
+    return [r["major_url-href"] for r in records]
+
+
+def test_jsonl_resume_drops_torn_line_and_keeps_new_records(tmp_path):
+    path = tmp_path / "out.jsonl"
+    sink = otago_pg.JsonlResultSink(path)
+    sink.append(record("u1"))
+    sink.append(record("u2"))
+    sink.close()
+    # 异常退出时最后一条只写了一半
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"major_url-href": "u3", "tit')
+
+    sink = otago_pg.JsonlResultSink(path)
+    assert len(sink) == 2
+    assert sink.done_urls == {"u1", "u2"}
+    sink.append(record("u3"))
+    sink.close()
+
+    assert urls(otago_pg.read_jsonl(path)) == ["u1", "u2", "u3"]
+
+
+def test_jsonl_gzip_resume_after_crash_keeps_appended_records(tmp_path):
+    crashed = tmp_path / "crashed" / "out.jsonl"
+    sink = otago_pg.JsonlResultSink(crashed, compress=True, fsync="always")
+    sink.append(record("u1"))
+    sink.append(record("u2"))
+    # 进程在关闭前被杀：gzip 文件没有结尾
+    resumed = tmp_path / "resumed" / "out.jsonl"
+    resumed.parent.mkdir()
+    shutil.copy(sink.path, str(resumed) + ".gz")
+    sink.close()
+
+    sink = otago_pg.JsonlResultSink(resumed, compress=True)
+    assert len(sink) == 2
+    sink.append(record("u3"))
+    sink.close()
+
+    assert urls(otago_pg.read_jsonl(sink.path)) == ["u1", "u2", "u3"]
+
+
+def test_read_jsonl_stops_at_corrupt_gzip_data(tmp_path):
+    path = tmp_path / "out.jsonl.gz"
+    first = gzip.compress(b'{"major_url-href": "u1"}\n')
+    second = bytearray(gzip.compress(b"".join(b'{"major_url-href": "u%d"}\n' % i for i in range(2, 200))))
+    # 第二个 member 的压缩数据被写坏，解压时抛 zlib.error
+    second[12:20] = b"\xff" * 8
+    path.write_bytes(first + bytes(second))
+
+    assert urls(otago_pg.read_jsonl(path)) == ["u1"]
+
+
+def test_jsonl_complete_output_starts_fresh(tmp_path):
+    path = tmp_path / "out.jsonl"
+    sink = otago_pg.JsonlResultSink(path)
+    sink.append(record("u1"))
+    sink.close(complete=True)
+
+    sink = otago_pg.JsonlResultSink(path)
+    assert len(sink) == 0
+    sink.append(record("u2"))
+    sink.close()
+    assert urls(otago_pg.read_jsonl(path)) == ["u2"]
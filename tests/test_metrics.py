@@ -0,0 +1,25 @@
+import pytest
+
+otago_pg = pytest.importorskip("otago_pg")
+
+percentile = otago_pg.MetricsCollector.percentile
+
+
+@pytest.mark.parametrize(
+    "n, pct, expected",
+    [
+        (10, 50, 5),
+        (10, 90, 9),
+        (10, 100, 10),
+        (100, 50, 50),
+        (100, 99, 99),
+        (1, 50, 1),
+        (10, 0, 1),
+    ],
+)
+def test_percentile_nearest_rank(n, pct, expected):
+    assert percentile(list(range(n, 0, -1)), pct) == expected
+
+
+def test_percentile_empty():
+    assert percentile([], 90) == 0.0
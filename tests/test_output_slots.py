@@ -0,0 +1,41 @@
+import pytest
+
+otago_pg = pytest.importorskip("otago_pg")
+
+
+def test_processes_get_separate_slots(tmp_path):
+    first = otago_pg.OutputSlot(tmp_path, "out")
+    second = otago_pg.OutputSlot(tmp_path, "out")
+    assert (first.index, second.index) == (0, 1)
+    assert (first.suffix, second.suffix) == ("", "_worker1")
+
+    # 还有槽位在使用时不能合并
+    assert second.lock_others() is None
+    first.close()
+    assert otago_pg.OutputSlot(tmp_path, "out").index == 0
+    second.close()
+
+
+@pytest.mark.parametrize("output_format, compress", [("jsonl", False), ("jsonl", True), ("blobstore", False)])
+def test_last_process_merges_worker_outputs(tmp_path, output_format, compress):
+    class Spider(otago_pg.UniversityOfOtagoPgSpider):
+        cache_dir = tmp_path / "cache"
+        output_dir = tmp_path / "output"
+        output_compress = compress
+
+    Spider.output_format = output_format
+    first, second = Spider(), Spider()
+    first.crawled_majors.append({"major_url-href": "a1"})
+    second.crawled_majors.append({"major_url-href": "b1"})
+    first.crawled_majors.append({"major_url-href": "a2"})
+
+    # 第一个进程先结束：另一个进程还在写，不合并也不打完成标记
+    first._close_output(complete=True)
+    primary_path = first.crawled_majors.path
+    assert not first.crawled_majors.complete_marker.exists()
+
+    second._close_output(complete=True)
+    records = list(otago_pg.read_results(primary_path))
+    assert [r["major_url-href"] for r in records] == ["a1", "a2", "b1"]
+    assert first.crawled_majors.complete_marker.exists()
+    assert not second.crawled_majors.path.exists()
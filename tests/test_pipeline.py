@@ -0,0 +1,29 @@
+import pytest
+
+otago_pg = pytest.importorskip("otago_pg")
+
+
+def test_pipeline_error_still_runs_after_scrape(tmp_path):
+    class Spider(otago_pg.UniversityOfOtagoPgSpider):
+        cache_dir = tmp_path / "cache"
+        output_dir = tmp_path / "output"
+
+        def get_list_urls(self, tab):
+            return [{"major_url-href": "u1"}, {"major_url-href": "u2"}]
+
+        async def _scrape_detail_page_async(self, major_info):
+            if major_info["major_url-href"] == "u1":
+                raise RuntimeError("database is locked")
+            self.crawled_majors.append(dict(major_info))
+            return major_info
+
+        def after_scrape(self, *args, **kwargs):
+            self.after_scrape_called = True
+            return super().after_scrape(*args, **kwargs)
+
+    shared = {key: "x" for key in Spider.init_data_fields}
+    spider = Spider(shared_init_data=shared)
+    spider.run_pipeline()
+
+    assert spider.after_scrape_called
+    assert [r["major_url-href"] for r in otago_pg.read_results(spider.crawled_majors.path)] == ["u2"]
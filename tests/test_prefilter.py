@@ -0,0 +1,48 @@
+import pytest
+
+otago_pg = pytest.importorskip("otago_pg")
+
+
+@pytest.fixture
+def spider(tmp_path):
+    class Spider(otago_pg.UniversityOfOtagoPgSpider):
+        cache_dir = tmp_path / "cache"
+        output_dir = tmp_path / "output"
+        prefilter_rules_path = tmp_path / "missing_rules.json"
+
+        def _probe_title(self, url):
+            self.probed.append(url)
+            return self.titles.get(url, "")
+
+    s = Spider()
+    s.probed = []
+    s.titles = {}
+    return s
+
+
+def kept_urls(spider, major_list):
+    return [m["major_url-href"] for m in spider.prefilter_programmes(major_list)]
+
+
+def test_keywords_only_checked_in_slug_and_link_text(spider):
+    major_list = [
+        {"major_url-href": "https://a/master-of-arts", "major_url": "Master of Arts",
+         "description": "Open to holders of a bachelor's degree"},
+        {"major_url-href": "https://a/ba", "major_url": "Bachelor of Arts"},
+        {"major_url-href": "https://a/doctor-of-philosophy-phd", "major_url": "Doctoral study"},
+    ]
+    assert kept_urls(spider, major_list) == ["https://a/master-of-arts"]
+
+
+def test_title_probe_skips_pages_with_current_state(spider):
+    spider.page_state.put("https://a/known", {}, {"major_name": "Master of Science"})
+    spider.page_state.put("https://a/skipped", {}, None)
+    spider.titles["https://a/new"] = "Bachelor of Science (Honours)"
+    major_list = [
+        {"major_url-href": "https://a/known", "major_url": "MSc"},
+        {"major_url-href": "https://a/skipped", "major_url": "BSc(Hons)"},
+        {"major_url-href": "https://a/new", "major_url": "BSc(Hons)"},
+    ]
+
+    assert kept_urls(spider, major_list) == ["https://a/known"]
+    assert spider.probed == ["https://a/new"]
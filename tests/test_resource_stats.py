@@ -0,0 +1,71 @@
+import pytest
+
+otago_pg = pytest.importorskip("otago_pg")
+
+
+class FakeDriver:
+    def __init__(self):
+        self.callbacks = {}
+
+    def set_callback(self, event, callback, immediate=False):
+        self.callbacks[event] = callback
+
+
+class FakeTab:
+    def __init__(self):
+        self.driver = FakeDriver()
+        self.cdp = []
+
+    def run_cdp(self, cmd, **params):
+        self.cdp.append(cmd)
+
+    def emit(self, event, **params):
+        self.driver.callbacks[event](**params)
+
+
+def profile(mode):
+    return otago_pg.ResourceBlockProfile(mode, ["image"], ["*.google-analytics.com"], ["*.otago.ac.nz"])
+
+
+def load(tab, request_id, url, size=None, blocked=False):
+    tab.emit("Network.requestWillBeSent", requestId=request_id, request={"url": url})
+    if blocked:
+        tab.emit("Network.loadingFailed", requestId=request_id, errorText="net::ERR_BLOCKED_BY_CLIENT",
+                 blockedReason="inspector")
+    else:
+        tab.emit("Network.loadingFinished", requestId=request_id, encodedDataLength=size)
+
+
+def test_audit_counts_cross_origin_bytes():
+    tab = FakeTab()
+    tracker = otago_pg.NetworkUsageTracker(tab)
+    assert tab.cdp == ["Network.enable"]
+    load(tab, "1", "https://www.otago.ac.nz/study", 2048)
+    load(tab, "2", "https://www.google-analytics.com/analytics.js", 4096)
+    load(tab, "3", "https://www.otago.ac.nz/banner.jpg?w=800", 2048)
+
+    stats = otago_pg.ResourceLoadStats(profile("audit"))
+    stats.record(*tracker.take(), load_seconds=1.0)
+
+    assert stats.bytes_loaded == 8192
+    assert (stats.matched_requests, stats.matched_bytes) == (2, 6144)
+    assert "可节省 6 KB" in stats.report_lines()[1]
+    assert tracker.take() == ([], [])
+
+
+def test_block_counts_blocked_requests():
+    tab = FakeTab()
+    tracker = otago_pg.NetworkUsageTracker(tab)
+    load(tab, "1", "https://www.otago.ac.nz/study", 2048)
+    load(tab, "2", "https://www.google-analytics.com/analytics.js", blocked=True)
+    load(tab, "3", "https://www.otago.ac.nz/banner.jpg", blocked=True)
+    # 其他原因失败的请求不算拦截
+    tab.emit("Network.requestWillBeSent", requestId="4", request={"url": "https://www.otago.ac.nz/x"})
+    tab.emit("Network.loadingFailed", requestId="4", errorText="net::ERR_ABORTED")
+
+    stats = otago_pg.ResourceLoadStats(profile("block"))
+    stats.record(*tracker.take(), load_seconds=1.0)
+
+    assert stats.bytes_loaded == 2048
+    assert stats.matched_requests == 2
+    assert "已拦截 2 个请求" in stats.report_lines()[1]
@@ -0,0 +1,39 @@
+import pytest
+
+otago_pg = pytest.importorskip("otago_pg")
+
+BASE = "https://www.otago.ac.nz/courses/qualifications/bsc"
+
+
+def fields(structure="<ul>s</ul>", fees="NZ$9,000"):
+    return {"programme_html": "<div>p</div>", "structure_html": structure, "fees": fees}
+
+
+def test_variants_with_identical_blocks_share_a_group():
+    assert otago_pg.variant_group_key(f"{BASE}?subject=math", fields()) == otago_pg.variant_group_key(
+        f"{BASE}/#chem", fields()
+    )
+
+
+@pytest.mark.parametrize("other", [fields(structure="<ul>t</ul>"), fields(fees="NZ$10,000")])
+def test_variants_with_own_structure_or_fees_are_grouped_apart(other):
+    assert otago_pg.variant_group_key(f"{BASE}?subject=math", fields()) != otago_pg.variant_group_key(
+        f"{BASE}?subject=chem", other
+    )
+
+
+def test_variant_cache_reuses_only_within_a_group():
+    cache = otago_pg.VariantFragmentCache()
+    calls = []
+
+    def compute(value):
+        calls.append(value)
+        return [value]
+
+    a = otago_pg.variant_group_key(f"{BASE}?subject=math", fields())
+    b = otago_pg.variant_group_key(f"{BASE}?subject=chem", fields(structure="<ul>t</ul>"))
+    assert cache.get_or_compute("apply_url", a, lambda: compute("math")) == ["math"]
+    assert cache.get_or_compute("apply_url", a, lambda: compute("again")) == ["math"]
+    assert cache.get_or_compute("apply_url", b, lambda: compute("chem")) == ["chem"]
+    assert calls == ["math", "chem"]
+    assert cache.stats["apply_url"] == {"reused": 1, "computed": 2}
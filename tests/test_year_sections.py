@@ -0,0 +1,42 @@
+import pytest
+from lxml import etree
+
+otago_pg = pytest.importorskip("otago_pg")
+
+
+def container(html):
+    return etree.HTML(html).find(".//div")
+
+
+def test_filter_year_sections_keeps_target_year_and_common_content():
+    html = (
+        "<div><p>intro</p>"
+        "<h3>2025 structure</h3><p>old</p>"
+        "<h3>2026 structure</h3><p>new</p>"
+        "<h4>Students who started in 2024</h4><p>transition</p>"
+        "<h3>2027 structure</h3><p>future</p>"
+        "<h3>Notes</h3><p>note</p></div>"
+    )
+    result = otago_pg.filter_year_sections(container(html), 2026)
+
+    assert result == (
+        "<div><p>intro</p><h3>2026 structure</h3><p>new</p>"
+        "<h4>Students who started in 2024</h4><p>transition</p>"
+        "<h3>Notes</h3><p>note</p></div>"
+    )
+
+
+def test_filter_year_sections_handles_nested_sections():
+    html = (
+        "<div><section><h2>2025</h2><p>a</p></section>"
+        "<section><h2>2026</h2><p>b</p><h3>From 2027</h3><p>c</p></section></div>"
+    )
+    result = otago_pg.filter_year_sections(container(html), 2026)
+
+    assert "<p>a</p>" not in result
+    assert "<h3>From 2027</h3><p>c</p>" in result
+
+
+def test_filter_year_sections_without_target_year_keeps_everything():
+    html = "<div><h3>2024 structure</h3><p>only</p></div>"
+    assert otago_pg.filter_year_sections(container(html), 2026) == html